@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agreement between the automatic and manual parses of the same passages.
+
+Sentences are aligned by the text they cover rather than by position. The
+words of every sentence on each side are normalized (Penn Treebank escapes
+undone, case and anything but letters and digits dropped). Sentences that
+are the same on both sides are matched whole by difflib, and only the
+stretches between them, where the sides split or word the text differently,
+are matched character by character, so the cost grows with the length of
+the passage and not its square. Counting the sentence pairs of all shared
+characters with np.unique gives the overlap of every pair of sentences that
+share text, and a single sweep over those pairs groups the sentences:
+    aligned      one auto sentence and one manual sentence
+    boundary     the two sides split the same text into different sentences
+    auto_only    an auto sentence with no counterpart
+    manual_only  a manual sentence with no counterpart
+
+sentence_pairs turns a pair of paragraphs into a table with one row per
+group, holding every statistic of both sides for aligned sentences and the
+bracket counts of their trees. Tables of many files concatenate with
+stats_table.concat, and report computes the agreement of a whole corpus
+from such a table with array operations: the distribution of the errors of
+every statistic, their correlation, and labeled and unlabeled bracket
+precision, recall and F1.
+
+>>> frame = sentence_pairs(auto_paragraph, manual_paragraph, 'GK')
+>>> report(frame)['brackets']['labeled']['f1']
+"""
+import difflib
+import re
+
+import numpy as np
+import pandas as pd
+
+import stats_schema
+import stats_table
+
+#The statistics compared, every numeric field of the statistics rows
+METRIC_FIELDS = stats_table.FIELDS[2:]
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+#Overlapping text smaller than this share of the shorter of two sentences
+#does not tie them together
+MIN_OVERLAP = 0.5
+
+_ESCAPES = {'-LRB-': '(', '-RRB-': ')', '-LSB-': '[', '-RSB-': ']',
+            '-LCB-': '{', '-RCB-': '}', '``': '"', "''": '"'}
+_NOT_TEXT = re.compile(r'[\W_]+')
+
+
+def normalize(words):
+    #The characters of a sentence's words that both sides agree on
+    return _NOT_TEXT.sub('', ''.join(_ESCAPES.get(word, word)
+                                     for word in words.split()).lower())
+
+
+def _tokens(words):
+    return [normalize(word) for word in words.split()]
+
+
+def _owners(lengths):
+    return np.repeat(np.arange(len(lengths)), lengths)
+
+
+def _character_edges(auto_texts, manual_texts):
+    #(auto sentence, manual sentence) of every character the two lists of
+    #texts share, from difflib's matching blocks over their joined characters
+    auto_owners = _owners([len(text) for text in auto_texts])
+    manual_owners = _owners([len(text) for text in manual_texts])
+    blocks = difflib.SequenceMatcher(None, ''.join(auto_texts), ''.join(manual_texts),
+                                     autojunk=False).get_matching_blocks()
+    return (np.concatenate([auto_owners[a:a + size] for a, _, size in blocks]),
+            np.concatenate([manual_owners[b:b + size] for _, b, size in blocks]))
+
+
+def _shared_characters(auto_texts, manual_texts):
+    #The sentences each shared character belongs to on both sides. Whole
+    #sentences are matched first, and characters are only matched within
+    #the stretches between identical sentences, where the two sides differ,
+    #which keeps difflib's quadratic worst case to those stretches.
+    auto_lengths = np.array([len(text) for text in auto_texts], dtype=np.int64)
+    auto_matched, manual_matched = [], []
+    blocks = difflib.SequenceMatcher(None, auto_texts, manual_texts,
+                                     autojunk=False).get_matching_blocks()
+    a_end = m_end = 0
+    for a, m, size in blocks:
+        if a > a_end and m > m_end:
+            auto_owners, manual_owners = _character_edges(auto_texts[a_end:a],
+                                                          manual_texts[m_end:m])
+            auto_matched.append(auto_owners + a_end)
+            manual_matched.append(manual_owners + m_end)
+        if size:
+            #Identical sentences share all their characters
+            counts = auto_lengths[a:a + size]
+            auto_matched.append(np.repeat(np.arange(a, a + size), counts))
+            manual_matched.append(np.repeat(np.arange(m, m + size), counts))
+        a_end, m_end = a + size, m + size
+    empty = [np.zeros(0, dtype=np.int64)]
+    return np.concatenate(auto_matched + empty), np.concatenate(manual_matched + empty)
+
+
+def align(auto_words, manual_words, min_overlap=MIN_OVERLAP):
+    #Groups the sentences of two lists, each sentence given as its words,
+    #and returns (auto sentences, manual sentences, overlap) per group in
+    #text order, where overlap is the share of the group's characters that
+    #both sides have
+    auto_texts = [normalize(words) for words in auto_words]
+    manual_texts = [normalize(words) for words in manual_words]
+    auto_lengths = np.array([len(text) for text in auto_texts], dtype=np.int64)
+    manual_lengths = np.array([len(text) for text in manual_texts], dtype=np.int64)
+    auto_matched, manual_matched = _shared_characters(auto_texts, manual_texts)
+    n_manual = max(len(manual_texts), 1)
+    edges, overlaps = np.unique(auto_matched * n_manual + manual_matched,
+                                return_counts=True)
+    edge_auto, edge_manual = edges // n_manual, edges % n_manual
+    shorter = np.minimum(auto_lengths[edge_auto], manual_lengths[edge_manual])
+    kept = overlaps >= min_overlap * shorter
+    #Edges come sorted by auto sentence, and an edge that shares a sentence
+    #with the group before it joins that group. A group covers every
+    #sentence between its first and last, including any too small to have
+    #an edge of its own.
+    groups = []
+    for a, m, overlap in zip(edge_auto[kept].tolist(), edge_manual[kept].tolist(),
+                             overlaps[kept].tolist()):
+        if groups and (a <= groups[-1][0][-1] or m <= groups[-1][1][-1]):
+            autos, manuals, shared = groups[-1]
+            autos.extend(range(autos[-1] + 1, a + 1))
+            manuals.extend(range(manuals[-1] + 1, m + 1))
+            groups[-1] = (autos, manuals, shared + overlap)
+        else:
+            groups.append(([a], [m], overlap))
+    #Sentences in no group go in between the groups around them
+    aligned = []
+    a_next = m_next = 0
+    for autos, manuals, shared in groups + [([len(auto_texts)], [len(manual_texts)], 0)]:
+        aligned.extend(([a], [], 0.0) for a in range(a_next, autos[0]))
+        aligned.extend(([], [m], 0.0) for m in range(m_next, manuals[0]))
+        if shared:
+            size = max(auto_lengths[autos].sum(), manual_lengths[manuals].sum(), 1)
+            aligned.append((autos, manuals, float(shared / size)))
+        a_next, m_next = autos[-1] + 1, manuals[-1] + 1
+    return aligned
+
+
+def _label_ids():
+    #The bracket label of every interned node type, without function tags,
+    #so that NP-SBJ and NP are the same bracket
+    from compact_tree import NODE_TYPES
+    labels = [node_type if node_type.startswith('-') else node_type.split('-')[0].split('=')[0]
+              for node_type in NODE_TYPES]
+    ids = {}
+    return np.array([ids.setdefault(label, len(ids)) for label in labels], dtype=np.int64)
+
+
+def _brackets(trees):
+    #(tree, label, start, end) rows for every phrase of trees, with start and
+    #end counted in leaves
+    from compact_tree import CompactConstituencyTree
+    rows = []
+    for i, tree in enumerate(trees):
+        if not isinstance(tree, CompactConstituencyTree):
+            tree = tree.compact()
+        arrays = tree.arrays
+        nodes = np.arange(tree.index, arrays.subtree_end[tree.index])
+        nodes = nodes[arrays.first_child[nodes] != -1]
+        offset = arrays.leaf_start[tree.index]
+        rows.append(np.stack([np.full(len(nodes), i), arrays.type_ids[nodes],
+                              arrays.leaf_start[nodes] - offset,
+                              arrays.leaf_end[nodes] - offset], axis=1))
+    rows = np.concatenate(rows) if rows else np.zeros((0, 4), dtype=np.int64)
+    rows = rows.astype(np.int64)
+    rows[:, 1] = _label_ids()[rows[:, 1]]
+    return pd.DataFrame(rows, columns=['tree', 'label', 'start', 'end'])
+
+
+def _matched(auto, manual, keys):
+    #How many brackets of each tree both sides have, counting repeats
+    auto_counts = auto.groupby(keys).size()
+    manual_counts = manual.groupby(keys).size()
+    both = pd.concat([auto_counts, manual_counts], axis=1, join='inner').min(axis=1)
+    return both.groupby(level='tree').sum()
+
+
+def bracket_counts(auto_trees, manual_trees):
+    #Bracket counts of pairs of trees over the same words: the brackets of
+    #each side and how many of them match with and without their labels
+    auto = _brackets(auto_trees)
+    manual = _brackets(manual_trees)
+    n = len(auto_trees)
+    counts = pd.DataFrame({
+            'brackets_auto': auto.groupby('tree').size(),
+            'brackets_manual': manual.groupby('tree').size(),
+            'labeled_matched': _matched(auto, manual, ['tree', 'label', 'start', 'end']),
+            'unlabeled_matched': _matched(auto, manual, ['tree', 'start', 'end']),
+    }).reindex(range(n)).fillna(0).astype(np.int64)
+    return counts
+
+
+def sentence_pairs(auto_paragraph, manual_paragraph, name=''):
+    #The alignment of two paragraphs' sentences, one row per group, with
+    #the statistics and bracket counts of the aligned sentences. label is
+    #name followed by the manual sentence number, as in compare_paragraphs.
+    auto_trees = auto_paragraph.constituency_trees
+    manual_trees = manual_paragraph.constituency_trees
+    groups = align([tree.words for tree in auto_trees],
+                   [tree.words for tree in manual_trees])
+    first = lambda indices: indices[0] if indices else -1
+    last = lambda indices: indices[-1] if indices else -1
+    kinds = ['aligned' if len(autos) == 1 and len(manuals) == 1
+             else 'boundary' if autos and manuals
+             else 'auto_only' if autos else 'manual_only'
+             for autos, manuals, _ in groups]
+    frame = pd.DataFrame({
+            'label': [name + (str(manuals[0]) if manuals else 'auto' + str(autos[0]))
+                      for autos, manuals, _ in groups],
+            'kind': kinds,
+            'auto_first': [first(autos) for autos, _, _ in groups],
+            'auto_last': [last(autos) for autos, _, _ in groups],
+            'manual_first': [first(manuals) for _, manuals, _ in groups],
+            'manual_last': [last(manuals) for _, manuals, _ in groups],
+            'overlap': [overlap for _, _, overlap in groups],
+    })
+    aligned = (frame['kind'] == 'aligned').to_numpy()
+    auto_index = np.where(aligned, frame['auto_first'], -1)
+    manual_index = np.where(aligned, frame['manual_first'], -1)
+    auto_table = auto_paragraph.statistics_table
+    manual_table = manual_paragraph.statistics_table
+    for field in METRIC_FIELDS:
+        frame['auto_' + field] = auto_table[field].reindex(auto_index).to_numpy()
+        frame['manual_' + field] = manual_table[field].reindex(manual_index).to_numpy()
+        frame['auto_' + field] = frame['auto_' + field].astype(stats_table.DTYPES[field])
+        frame['manual_' + field] = frame['manual_' + field].astype(stats_table.DTYPES[field])
+    #Brackets are only comparable between trees over the same words
+    same_words = np.zeros(len(frame), dtype=bool)
+    for row in np.flatnonzero(aligned):
+        same_words[row] = _tokens(auto_trees[auto_index[row]].words) == \
+            _tokens(manual_trees[manual_index[row]].words)
+    frame['same_words'] = same_words
+    rows = np.flatnonzero(same_words)
+    counts = bracket_counts([auto_trees[auto_index[row]] for row in rows],
+                            [manual_trees[manual_index[row]] for row in rows])
+    for column in counts.columns:
+        frame[column] = 0
+        frame.loc[rows, column] = counts[column].to_numpy()
+    return frame
+
+
+def comparison_table(frame):
+    #The columns of the comparison spreadsheet, one row per group of
+    #sentence_pairs. Groups that are not aligned one to one keep their row,
+    #with empty statistics, and the kind column says why.
+    frame = frame.reset_index(drop=True)
+    columns = {'index': frame['label']}
+    for column, field, side in stats_schema.COMPARISON_SCHEMA:
+        columns[column] = frame[side + '_' + field]
+    columns['kind'] = frame['kind']
+    return pd.DataFrame(columns)
+
+
+def _number(value):
+    #JSON has no nan
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _correlation(x, y):
+    if len(x) < 2 or x.std() == 0 or y.std() == 0:
+        return None
+    return _number(np.corrcoef(x, y)[0, 1])
+
+
+def metric_agreement(frame, fields=METRIC_FIELDS):
+    #The error distribution and correlation of each statistic over the
+    #aligned sentences of frame, from whole columns at once
+    aligned = frame[frame['kind'] == 'aligned']
+    metrics = {}
+    for field in fields:
+        auto = aligned['auto_' + field].astype('float64').to_numpy()
+        manual = aligned['manual_' + field].astype('float64').to_numpy()
+        both = ~np.isnan(auto) & ~np.isnan(manual)
+        auto, manual = auto[both], manual[both]
+        errors = auto - manual
+        if not len(errors):
+            metrics[field] = {'n': 0}
+            continue
+        metrics[field] = {
+                'n': int(len(errors)),
+                'bias': _number(errors.mean()),
+                'mae': _number(np.abs(errors).mean()),
+                'rmse': _number(np.sqrt((errors ** 2).mean())),
+                'exact': _number((errors == 0).mean()),
+                'quantiles': {str(q): _number(v) for q, v in
+                              zip(QUANTILES, np.quantile(errors, QUANTILES))},
+                'pearson': _correlation(auto, manual),
+                'spearman': _correlation(pd.Series(auto).rank().to_numpy(),
+                                         pd.Series(manual).rank().to_numpy()),
+        }
+    return metrics
+
+
+def error_distribution(frame, field, bins=None, by=None):
+    #How often each error (auto minus manual) of field occurs among the
+    #aligned sentences, binned and grouped like stats_table.distribution
+    aligned = frame[frame['kind'] == 'aligned']
+    errors = pd.DataFrame({'error': aligned['auto_' + field].astype('float64')
+                           - aligned['manual_' + field].astype('float64')})
+    if by is not None:
+        errors[by] = aligned[by].to_numpy()
+    return stats_table.distribution(errors.dropna(subset=['error']), 'error', bins, by)
+
+
+def _scores(matched, auto, manual):
+    precision = matched / auto if auto else None
+    recall = matched / manual if manual else None
+    f1 = 2 * matched / (auto + manual) if auto + manual else None
+    return {'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def bracket_agreement(frame):
+    #evalb-style bracket scores, summed over every comparable sentence
+    comparable = frame[frame['same_words']]
+    auto = int(comparable['brackets_auto'].sum())
+    manual = int(comparable['brackets_manual'].sum())
+    return {
+            'sentences': int(len(comparable)),
+            'labeled': _scores(int(comparable['labeled_matched'].sum()), auto, manual),
+            'unlabeled': _scores(int(comparable['unlabeled_matched'].sum()), auto, manual),
+            'exact_match': _number(((comparable['labeled_matched'] == comparable['brackets_auto'])
+                                    & (comparable['labeled_matched'] == comparable['brackets_manual'])
+                                    ).mean()) if len(comparable) else None,
+    }
+
+
+def report(frame, by=None):
+    #The agreement of the sentences of frame as a dict that json can write.
+    #With by, such as the file column of process_multiple_manual, there is
+    #also a report for each of its groups.
+    kinds = frame['kind'].value_counts()
+    result = {
+            'sentences': {
+                'auto': int(sum(frame.loc[frame['auto_first'] >= 0, 'auto_last']
+                                - frame.loc[frame['auto_first'] >= 0, 'auto_first'] + 1)),
+                'manual': int(sum(frame.loc[frame['manual_first'] >= 0, 'manual_last']
+                                  - frame.loc[frame['manual_first'] >= 0, 'manual_first'] + 1)),
+                **{kind: int(kinds.get(kind, 0))
+                   for kind in ('aligned', 'boundary', 'auto_only', 'manual_only')},
+            },
+            'boundaries': frame.loc[frame['kind'] != 'aligned',
+                                    ['label', 'kind', 'auto_first', 'auto_last',
+                                     'manual_first', 'manual_last']
+                                    ].to_dict('records'),
+            'metrics': metric_agreement(frame),
+            'brackets': bracket_agreement(frame),
+    }
+    if by is not None:
+        result['groups'] = {str(key): report(group)
+                            for key, group in frame.groupby(by, observed=True, sort=False)}
+    return result
@@ -6,13 +6,31 @@ Created on Mon Mar  2 09:40:03 2020
 @author: Lab
 """
 
-from allennlp.models.archival import load_archive
-from allennlp.service.predictors import Predictor
+import inference
+import instrumentation
+import models
+import scheduling
 
-archive = load_archive(
-            "https://s3-us-west-2.amazonaws.com/allennlp/models/elmo-constituency-parser-2018.03.14.tar.gz"
-        )
+ARCHIVE = models.CONSTITUENCY_ARCHIVE
+
+#Building a Predictor is expensive, so the models registry loads one instance
+#on first use and shares it with every call below for the life of the process
 
 def constituency_parse(sentence):
-    predictor = Predictor.from_archive(archive, 'constituency-parser')
-    return predictor.predict(sentence)
\ No newline at end of file
+    with instrumentation.stage('constituency_predict', sentences=1), inference.no_grad():
+        return models.get('constituency').predict(sentence)
+
+def constituency_parse_batch(sentences, batch_size=32, max_tokens=None):
+    #Parses many sentences through predict_batch_json in length-bucketed
+    #batches of at most batch_size sentences and max_tokens padded words,
+    #returning the outputs in the same order as the input
+    predictor = models.get('constituency')
+    sentences = list(sentences)
+
+    def predict(batch):
+        with inference.no_grad():
+            return predictor.predict_batch_json(
+                    [{'sentence': sentence} for sentence in batch])
+
+    return scheduling.run_batches(sentences, [len(sentence.split()) for sentence in sentences],
+                                  predict, 'constituency_predict', max_tokens, batch_size)
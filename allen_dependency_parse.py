@@ -6,7 +6,29 @@ Created on Mon Mar  2 10:55:40 2020
 @author: Lab
 """
 
-from allennlp.predictors.predictor import Predictor
-predictor = Predictor.from_path("https://s3-us-west-2.amazonaws.com/allennlp/models/biaffine-dependency-parser-ptb-2018.08.23.tar.gz")
+import inference
+import instrumentation
+import models
+import scheduling
+
+ARCHIVE = models.DEPENDENCY_ARCHIVE
+
 def dependency_parse(sentence="If I bring 10 dollars tomorrow, can you buy me lunch?"):
-    return predictor.predict(sentence)
\ No newline at end of file
+    with instrumentation.stage('dependency_predict', sentences=1), inference.no_grad():
+        return models.get('dependency').predict(sentence)
+
+
+def dependency_parse_batch(sentences, batch_size=32, max_tokens=None):
+    #Parses many sentences through predict_batch_json in length-bucketed
+    #batches of at most batch_size sentences and max_tokens padded words,
+    #returning the outputs in the same order as the input
+    predictor = models.get('dependency')
+    sentences = list(sentences)
+
+    def predict(batch):
+        with inference.no_grad():
+            return predictor.predict_batch_json(
+                    [{'sentence': sentence} for sentence in batch])
+
+    return scheduling.run_batches(sentences, [len(sentence.split()) for sentence in sentences],
+                                  predict, 'dependency_predict', max_tokens, batch_size)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Constituency and dependency parsing of the same sentences as one job.
+
+Calling each AllenNLP predictor on raw text makes both of them tokenize and
+tag the sentence with spaCy, and runs the two models one after the other.
+parse_sentences tokenizes each sentence once, builds the instances of both
+models from those same tokens, and runs the two models' inference at the same
+time on two threads. Per-sentence latency approaches that of the slower model
+instead of the sum of the two. Because both trees come from one token list,
+leaf i of the constituency tree and word position i of the dependency tree
+are always the same token.
+
+Results go through the parse cache like the separate parses do, and only
+sentences missing from it are parsed.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import inference
+import instrumentation
+import models
+import parse_cache
+import scheduling
+
+_pool = None
+_pool_pid = None
+
+
+def _get_pool():
+    #A process forked from one that has used the pool, such as a corpus
+    #worker, inherits the pool without its threads, so each process makes
+    #its own
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ThreadPoolExecutor(max_workers=2)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def tokenize(sentences):
+    #Returns, for each sentence, its spaCy tokens as (text, tag_, pos_) triples
+    predictor = models.get('constituency')
+    with instrumentation.stage('tokenize', sentences=len(sentences)):
+        if hasattr(predictor, 'tokenize'):
+            return [predictor.tokenize(sentence) for sentence in sentences]
+        return [[(token.text, token.tag_, token.pos_)
+                 for token in predictor._tokenizer.split_words(sentence)]
+                for sentence in sentences]
+
+
+def _instances(predictor, name, token_lists):
+    reader = predictor._dataset_reader
+    if name == 'constituency':
+        return [reader.text_to_instance([t[0] for t in tokens], [t[1] for t in tokens])
+                for tokens in token_lists]
+    #The dependency reader is trained on either PTB tags or universal tags
+    tag = 1 if reader.use_language_specific_pos else 2
+    return [reader.text_to_instance([t[0] for t in tokens], [t[tag] for t in tokens])
+            for tokens in token_lists]
+
+
+def predict_tokens(name, token_lists, batch_size=32, max_tokens=None):
+    #Runs the named model on already tokenized sentences and returns its
+    #hierplane trees. Sentences of similar length are batched together, at
+    #most batch_size sentences and max_tokens padded tokens at a time (see
+    #scheduling.py).
+    predictor = models.get(name)
+
+    def predict(batch):
+        with inference.no_grad():
+            if hasattr(predictor, 'predict_tokens'):
+                outputs = predictor.predict_tokens([[t[0] for t in tokens]
+                                                    for tokens in batch])
+            else:
+                outputs = predictor.predict_batch_instance(
+                        _instances(predictor, name, batch))
+        return [output['hierplane_tree'] for output in outputs]
+
+    return scheduling.run_batches(token_lists, [len(tokens) for tokens in token_lists],
+                                  predict, name + '_predict', max_tokens, batch_size)
+
+
+def fused_parse(sentences, batch_size=32, max_tokens=None):
+    #Tokenizes sentences once and runs both models on the tokens concurrently.
+    #Returns their constituency and dependency hierplane trees.
+    token_lists = tokenize(sentences)
+    pool = _get_pool()
+    constituency = pool.submit(predict_tokens, 'constituency', token_lists,
+                                batch_size, max_tokens)
+    dependency = pool.submit(predict_tokens, 'dependency', token_lists,
+                              batch_size, max_tokens)
+    return constituency.result(), dependency.result()
+
+
+def parse_sentences(sentences, batch_size=32, max_tokens=None):
+    #Returns the constituency and dependency hierplane trees of sentences,
+    #taking what it can from the parse cache
+    sentences = list(sentences)
+    parsed_dependencies = {}
+
+    def parse_both(missing):
+        constituency, dependency = fused_parse(missing, batch_size, max_tokens)
+        parsed_dependencies.update(zip(missing, dependency))
+        return constituency
+
+    def parse_dependencies(missing):
+        #Sentences whose constituency parse was cached are parsed here alone
+        rest = [sentence for sentence in missing if sentence not in parsed_dependencies]
+        if rest:
+            parsed_dependencies.update(zip(
+                    rest, predict_tokens('dependency', tokenize(rest), batch_size, max_tokens)))
+        return [parsed_dependencies[sentence] for sentence in missing]
+
+    constituency = parse_cache.cached_parse(
+            sentences, 'allennlp-constituency',
+            inference.cache_archive(models.CONSTITUENCY_ARCHIVE, 'constituency'), parse_both)
+    dependency = parse_cache.cached_parse(
+            sentences, 'allennlp-dependency',
+            inference.cache_archive(models.DEPENDENCY_ARCHIVE, 'dependency'), parse_dependencies)
+    return constituency, dependency
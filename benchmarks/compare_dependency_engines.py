@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compares the spacy dependency engine with the AllenNLP dependency parser.
+
+The text, by default the sentences of the recorded fixtures in fixtures/, is
+split with a parsing spaCy pipeline. The dependency trees of the spacy
+engine come from that same parse, and those of allennlp from the biaffine
+model with the parse cache turned off. The report gives the time each engine
+takes, how far mean_, total_ and max_SynDepLen of the spacy engine are from
+the AllenNLP numbers, and how many of the AllenNLP head-tail attachments
+spaCy also finds in the sentences both engines tokenized alike:
+
+    python benchmarks/compare_dependency_engines.py --text passage.txt
+
+--stub replaces the AllenNLP parser with the stub predictor, which only
+checks the plumbing.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import parse_cache
+import stub_predictors
+from depth import DependencyTree
+from run_benchmarks import metadata
+from splitting import parsed_spans
+
+FIELDS = ['mean_SynDepLen', 'total_SynDepLen', 'max_SynDepLen']
+
+
+def statistics(trees):
+    #A tree is None for a sentence without relations, counted as nan
+    return {field: np.array([getattr(tree, field) if tree is not None else np.nan
+                             for tree in trees], dtype=np.float64)
+            for field in FIELDS}
+
+
+def attachment(spacy_trees, allen_trees):
+    #The share of AllenNLP's (head, tail) attachments spaCy also makes,
+    #over the sentences whose words are the same for both engines
+    found = total = sentences = 0
+    for spacy_tree, allen_tree in zip(spacy_trees, allen_trees):
+        if spacy_tree is None or allen_tree is None or spacy_tree.words != allen_tree.words:
+            continue
+        sentences += 1
+        spacy_edges = set(zip(spacy_tree._head_pos, spacy_tree._tail_pos))
+        allen_edges = list(zip(allen_tree._head_pos, allen_tree._tail_pos))
+        found += sum(edge in spacy_edges for edge in allen_edges)
+        total += len(allen_edges)
+    return {'sentences': sentences, 'unlabeled': found / total if total else None}
+
+
+def divergence(spacy_trees, allen_trees):
+    spacy, allen = statistics(spacy_trees), statistics(allen_trees)
+    report = {}
+    for field in FIELDS:
+        both = ~np.isnan(spacy[field]) & ~np.isnan(allen[field])
+        difference = spacy[field][both] - allen[field][both]
+        report[field] = {
+                'mean_difference': float(difference.mean()) if both.any() else None,
+                'mean_abs': float(np.abs(difference).mean()) if both.any() else None,
+                'max_abs': float(np.abs(difference).max()) if both.any() else None,
+                'correlation': float(np.corrcoef(spacy[field][both], allen[field][both])[0, 1])
+                if both.sum() > 1 and allen[field][both].std() and spacy[field][both].std()
+                else None,
+                'same': float((difference == 0).mean()) if both.any() else None,
+        }
+    report['attachment'] = attachment(spacy_trees, allen_trees)
+    return report
+
+
+def run(text, split_mode):
+    parse_cache.configure(None)
+    start = time.perf_counter()
+    spans = parsed_spans(text, split_mode)
+    split_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    spacy_trees = DependencyTree.dependency_parse_batch(spans, 'spacy')
+    spacy_seconds = time.perf_counter() - start
+    sentences = [str(span) for span in spans]
+    start = time.perf_counter()
+    allen_trees = DependencyTree.dependency_parse_batch(sentences, 'allennlp')
+    allen_seconds = time.perf_counter() - start
+    return {
+            'sentences': len(sentences),
+            'seconds': {'split': split_seconds, 'spacy': spacy_seconds,
+                        'allennlp': allen_seconds},
+            'divergence': divergence(spacy_trees, allen_trees),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--text', help='file with the text to parse, instead of '
+                        'the fixture sentences')
+    parser.add_argument('--split-mode', help="splitter mode, 'full' by default")
+    parser.add_argument('--output', default='dependency_engines.json')
+    parser.add_argument('--stub', action='store_true',
+                        help='use the stub AllenNLP predictor')
+    args = parser.parse_args(argv)
+    if args.text:
+        with open(args.text) as f:
+            text = f.read()
+    else:
+        text = ' '.join(stub_predictors.load_fixtures()['constituency'])
+    if args.stub:
+        stub_predictors.install()
+    report = run(text, args.split_mode)
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(), 'report': report}, f, indent=1)
+    seconds = report['seconds']
+    print(f"{report['sentences']} sentences: split {seconds['split']:.4f}s, "
+          f"spacy {seconds['spacy']:.4f}s, allennlp {seconds['allennlp']:.4f}s")
+    print(f"{'statistic':<18}{'mean diff':>11}{'mean abs':>10}{'max abs':>9}"
+          f"{'corr':>7}{'same':>7}")
+    for field in FIELDS:
+        values = report['divergence'][field]
+        if values['mean_abs'] is None:
+            continue
+        correlation = values['correlation']
+        print(f"{field:<18}{values['mean_difference']:>11.3f}{values['mean_abs']:>10.3f}"
+              f"{values['max_abs']:>9.1f}"
+              f"{correlation if correlation is not None else float('nan'):>7.3f}"
+              f"{values['same']:>7.1%}")
+    attached = report['divergence']['attachment']
+    if attached['unlabeled'] is not None:
+        print(f"unlabeled attachment agreement {attached['unlabeled']:.1%} "
+              f"over {attached['sentences']} sentences tokenized alike")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compares the int8 quantized parsers with the full precision ones on CPU.
+
+Both modes parse the same sentences, by default those of the recorded
+fixtures in fixtures/, with the parse cache turned off. The report gives the
+speedup of the quantized models and, for total_Ydepth, total_Fdepth and
+total_SynDepLen, how far their values drift from the full precision ones:
+
+    python benchmarks/compare_inference.py --threads 4 --output inference.json
+
+--stub runs the same comparison with stub predictors, which only checks
+the plumbing since stubs are not quantized. With --max-relative-drift the
+script exits with status 1 when the relative drift of any statistic is
+above that fraction, so it can gate quantization in CI:
+
+    python benchmarks/compare_inference.py --max-relative-drift 0.01
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import inference
+import models
+import parse_cache
+import stub_predictors
+from depth import parse_sentences, tree_statistics
+from run_benchmarks import metadata, timed
+
+DRIFT_FIELDS = ['total_Ydepth', 'total_Fdepth', 'total_SynDepLen']
+
+
+def run_mode(sentences, quantize, threads, repeat, batch_size, stub):
+    #Loads the parsers in one mode and returns the timings of parsing
+    #sentences and the statistics of every sentence
+    inference.configure(threads=threads, quantize=quantize)
+    models.unload('constituency')
+    models.unload('dependency')
+    if stub:
+        stub_predictors.install()
+    models.preload('constituency', 'dependency')
+    parse_sentences(sentences[:batch_size], 'allennlp', batch_size)
+    timing = timed(lambda: parse_sentences(sentences, 'allennlp', batch_size), repeat)
+    constituency_trees, dependency_trees = parse_sentences(sentences, 'allennlp', batch_size)
+    rows = [tree_statistics(sentence, ct, dt) for sentence, ct, dt
+            in zip(sentences, constituency_trees, dependency_trees)]
+    return timing, {field: np.array([row[field] for row in rows], dtype=np.float64)
+                    for field in DRIFT_FIELDS}
+
+
+def drift(full, quantized):
+    #How far each statistic of the quantized models is from full precision
+    report = {}
+    for field in DRIFT_FIELDS:
+        difference = np.abs(quantized[field] - full[field])
+        report[field] = {
+                'mean_abs': float(difference.mean()),
+                'max_abs': float(difference.max()),
+                'relative': float(difference.sum() / max(np.abs(full[field]).sum(), 1)),
+                'changed': float((difference > 0).mean()),
+        }
+    return report
+
+
+def exceeded(report, max_relative_drift):
+    #The statistics whose relative drift is above max_relative_drift
+    return [field for field, values in report['drift'].items()
+            if values['relative'] > max_relative_drift]
+
+
+def run(sentences, threads, repeat, batch_size, stub):
+    parse_cache.configure(None)
+    full_timing, full = run_mode(sentences, False, threads, repeat, batch_size, stub)
+    quantized_timing, quantized = run_mode(sentences, True, threads, repeat, batch_size, stub)
+    return {
+            'sentences': len(sentences),
+            'threads': threads,
+            'full': full_timing,
+            'quantized': quantized_timing,
+            'speedup': full_timing['median'] / quantized_timing['median'],
+            'drift': drift(full, quantized),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sentences', help='file with one sentence per line, '
+                        'instead of the fixture sentences')
+    parser.add_argument('--output', default='inference_results.json')
+    parser.add_argument('--threads', type=int, help='intra-op threads for torch')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--stub', action='store_true',
+                        help='use stub predictors instead of the models')
+    parser.add_argument('--max-relative-drift', type=float,
+                        help='exit with status 1 if the relative drift of any '
+                        'statistic is above this fraction')
+    args = parser.parse_args(argv)
+    if args.sentences:
+        with open(args.sentences) as f:
+            sentences = [line.strip() for line in f if line.strip()]
+    else:
+        sentences = list(stub_predictors.load_fixtures()['constituency'])
+    report = run(sentences, args.threads, args.repeat, args.batch_size, args.stub)
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(), 'report': report}, f, indent=1)
+    print(f"{'mode':<12}{'median':>12}")
+    print(f"{'full':<12}{report['full']['median']:>12.6f}")
+    print(f"{'int8':<12}{report['quantized']['median']:>12.6f}")
+    print(f"speedup {report['speedup']:.2f}x on {report['sentences']} sentences")
+    print(f"{'statistic':<20}{'mean abs':>12}{'max abs':>12}{'relative':>12}{'changed':>10}")
+    for field, values in report['drift'].items():
+        print(f"{field:<20}{values['mean_abs']:>12.4f}{values['max_abs']:>12.4f}"
+              f"{values['relative']:>12.4%}{values['changed']:>10.1%}")
+    if args.max_relative_drift is not None:
+        fields = exceeded(report, args.max_relative_drift)
+        if fields:
+            print(f"relative drift above {args.max_relative_drift:.4%}: {', '.join(fields)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Times each stage of depth.py separately, without the neural models.
+
+Parser output comes from the recorded hierplane fixtures in fixtures/ and
+from generated wide and deep synthetic trees, and the predictors are replaced
+by stub_predictors, so the timings measure this code alone. Results are
+written as JSON so runs on different commits can be compared:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import stub_predictors
+from depth import ConstituencyTree, DependencyTree, sentence_chunk_statistics
+
+
+def timed(function, repeat, setup=None):
+    #Runs function repeat times and returns its timings in seconds. setup,
+    #if given, runs untimed before each run and its result is passed in.
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        times.append(time.perf_counter() - start)
+    return {
+            'repeat': repeat,
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+    }
+
+
+def cases(fixtures, sizes):
+    #(name, constituency hierplane roots, dependency hierplane roots)
+    yield ('fixtures',
+           [output['hierplane_tree']['root']
+            for output in fixtures['constituency'].values()],
+           [output['hierplane_tree']['root']
+            for output in fixtures['dependency'].values()])
+    for size in sizes:
+        yield (f'deep_{size}',
+               [stub_predictors.deep_constituency(size)['hierplane_tree']['root']],
+               [stub_predictors.deep_dependency(size)['hierplane_tree']['root']])
+        yield (f'wide_{size}',
+               [stub_predictors.wide_constituency(size)['hierplane_tree']['root']],
+               [stub_predictors.wide_dependency(size)['hierplane_tree']['root']])
+
+
+def constituency_metrics(trees):
+    for tree in trees:
+        tree.total_Ydepth
+        tree.max_Fdepth
+        tree.tally_parts_of_speech()
+
+
+def dependency_metrics(trees):
+    for tree in trees:
+        tree.total_SynDepLen
+        tree.max_SynDepLen
+
+
+def run(repeat, sizes, split_mode, text_copies):
+    fixtures = stub_predictors.load_fixtures()
+    stub_predictors.install()
+    sentences = list(fixtures['constituency'])
+    results = {}
+
+    try:
+        from splitting import split_sentences
+        text = ' '.join(sentences * text_copies)
+        split_sentences(text, split_mode)
+        results[f'split/{split_mode}_{len(sentences) * text_copies}'] = timed(
+                lambda: split_sentences(text, split_mode), repeat)
+    except (ImportError, OSError) as error:
+        print(f'skipping sentence splitting: {error}', file=sys.stderr)
+
+    for name, constituency_roots, dependency_roots in cases(fixtures, sizes):
+        def make_constituency_trees(roots=constituency_roots):
+            return [ConstituencyTree.allen_constituency_process(root) for root in roots]
+
+        def make_dependency_trees(roots=dependency_roots):
+            return [DependencyTree.allen_dependency_process(root) for root in roots]
+
+        results[f'convert_constituency/{name}'] = timed(make_constituency_trees, repeat)
+        results[f'convert_dependency/{name}'] = timed(make_dependency_trees, repeat)
+        results[f'metrics_constituency/{name}'] = timed(
+                constituency_metrics, repeat, make_constituency_trees)
+        results[f'metrics_dependency/{name}'] = timed(
+                dependency_metrics, repeat, make_dependency_trees)
+        try:
+            import graphviz
+            results[f'graph_constituency/{name}'] = timed(
+                    lambda trees: [tree.frazier_yngve_digraph().source for tree in trees],
+                    repeat, make_constituency_trees)
+            results[f'graph_dependency/{name}'] = timed(
+                    lambda trees: [tree.digraph().source for tree in trees],
+                    repeat, make_dependency_trees)
+        except ImportError:
+            pass
+
+    results[f'statistics/fixtures_{len(sentences) * text_copies}'] = timed(
+            lambda: sentence_chunk_statistics(sentences * text_copies), repeat)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, previous):
+    #Prints the ratio of each stage's median time to that of a previous run
+    print(f"{'stage':<45}{'before':>12}{'after':>12}{'ratio':>8}")
+    for key, result in results.items():
+        if key not in previous:
+            continue
+        before = previous[key]['median']
+        after = result['median']
+        print(f'{key:<45}{before:>12.6f}{after:>12.6f}{after / before:>8.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='results file of an earlier run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5000])
+    parser.add_argument('--split-mode', default='sentencizer')
+    parser.add_argument('--text-copies', type=int, default=50,
+                        help='how many times the fixture sentences are repeated')
+    args = parser.parse_args(argv)
+    results = run(args.repeat, args.sizes, args.split_mode, args.text_copies)
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(), 'results': results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+    else:
+        for key, result in results.items():
+            print(f"{key:<45}{result['median']:>12.6f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoints for long process_multiple_manual runs.
+
+A checkpoint directory holds a manifest, manifest.json, with one entry per
+input file. The entry records the SHA-1 of the file's contents, whether it
+was finished or failed, and how many sentences it yielded. The sentence
+pairs of every finished file are saved in results/ as soon as the file is
+done. A file that raises is quarantined: its traceback is saved in
+quarantine/ and the run carries on with the next file.
+
+When a run is started again with the same checkpoint directory, finished
+files are read back from results/ instead of being parsed again. Failed
+files are skipped too, unless they have changed since or retry_failed is
+set. The manifest and result files are replaced atomically, so a run that
+is killed part way never leaves a half-written one behind.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
+
+MANIFEST = 'manifest.json'
+#Bumped whenever process_manual_file starts returning something else, so
+#results saved by older runs are parsed again rather than loaded
+RESULT_FORMAT = 3
+
+
+def file_digest(path):
+    #None if the file cannot be read, which fails the file when it is run
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _replace(path, write, mode='w'):
+    #Writes a file through a temporary file in the same directory, then
+    #moves it into place in one step
+    temporary = path + '.tmp'
+    with open(temporary, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class Manifest:
+    def __init__(self, directory):
+        self.directory = directory
+        for subdirectory in ('results', 'quarantine'):
+            os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        self.path = os.path.join(directory, MANIFEST)
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.files = json.load(f)['files']
+        else:
+            self.files = {}
+
+    def __repr__(self):
+        return f'<Manifest {self.directory}: {len(self.finished())} finished, ' \
+               f'{len(self.failed())} failed>'
+
+    @staticmethod
+    def key(path, dirname):
+        #Entries are keyed by both, since one file may be compared under
+        #several dirnames
+        name = re.sub(r'[^\w.-]+', '_', dirname).strip('_') or 'file'
+        return name + '-' + hashlib.sha1(
+                (path + '\0' + dirname).encode('utf-8')).hexdigest()[:10]
+
+    def finished(self):
+        return [key for key, entry in self.files.items() if entry['status'] == 'done']
+
+    def failed(self):
+        return [key for key, entry in self.files.items() if entry['status'] == 'failed']
+
+    def save(self):
+        _replace(self.path, lambda f: json.dump({'files': self.files}, f, indent=1))
+
+    def status(self, path, dirname, digest):
+        #'done' or 'failed' if the file has been run with its current
+        #contents, None if it still has to be
+        entry = self.files.get(self.key(path, dirname))
+        if entry is None or entry['digest'] != digest:
+            return None
+        if entry['status'] == 'done' and (
+                entry.get('format') != RESULT_FORMAT
+                or not os.path.exists(os.path.join(self.directory, entry['result']))):
+            return None
+        return entry['status']
+
+    def load(self, path, dirname):
+        entry = self.files[self.key(path, dirname)]
+        with open(os.path.join(self.directory, entry['result']), 'rb') as f:
+            return pickle.load(f)
+
+    def record_done(self, path, dirname, digest, table):
+        key = self.key(path, dirname)
+        result = os.path.join('results', key + '.pkl')
+        _replace(os.path.join(self.directory, result),
+                 lambda f: pickle.dump(table, f, protocol=4), 'wb')
+        self.files[key] = {'path': path, 'dirname': dirname, 'digest': digest,
+                           'status': 'done', 'sentences': len(table),
+                           'result': result, 'format': RESULT_FORMAT,
+                           'time': time.time()}
+        self.save()
+
+    def record_failed(self, path, dirname, digest, error):
+        key = self.key(path, dirname)
+        quarantine = os.path.join('quarantine', key + '.txt')
+        _replace(os.path.join(self.directory, quarantine), lambda f: f.write(error))
+        self.files[key] = {'path': path, 'dirname': dirname, 'digest': digest,
+                           'status': 'failed', 'error': error.strip().splitlines()[-1],
+                           'traceback': quarantine, 'time': time.time()}
+        self.save()
+        return os.path.join(self.directory, quarantine)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Array-backed constituency trees for keeping whole corpora of parses in memory.
+
+A CompactConstituencyTree stores one tree as a handful of flat NumPy arrays,
+with the nodes in preorder: parent, first child and next sibling indices, the
+end of each node's subtree, interned node type ids, and one shared array of
+leaves in which every node's leaves are the span leaf_start:leaf_end. Nodes
+are lightweight views onto those arrays that offer the same properties as
+depth.ConstituencyTree, so statistics and graphs work unchanged on either.
+"""
+import numpy as np
+
+import pos_tally
+
+#Node types are interned in one table shared by every compact tree, so the
+#same type has the same id throughout a corpus
+NODE_TYPES = []
+NODE_TYPE_IDS = {}
+
+
+
+def intern_node_type(node_type):
+    if node_type not in NODE_TYPE_IDS:
+        NODE_TYPE_IDS[node_type] = len(NODE_TYPES)
+        NODE_TYPES.append(node_type)
+    return NODE_TYPE_IDS[node_type]
+
+
+class TreeArrays:
+    #The storage shared by all nodes of one tree
+    __slots__ = ('parent', 'first_child', 'next_sibling', 'subtree_end',
+                 'type_ids', 'words', 'leaf_nodes', 'leaf_start', 'leaf_end',
+                 '_scores')
+
+    def __init__(self, parent, type_ids, words):
+        #parent and type_ids list the nodes in preorder, words holds the word
+        #of each leaf node and None for the others
+        n = len(parent)
+        self.parent = np.array(parent, dtype=np.int32)
+        self.type_ids = np.array(type_ids, dtype=np.int32)
+        self.first_child = np.full(n, -1, dtype=np.int32)
+        self.next_sibling = np.full(n, -1, dtype=np.int32)
+        self.subtree_end = np.arange(1, n + 1, dtype=np.int32)
+        last_child = {}
+        for i in range(n - 1, 0, -1):
+            #Walking backwards, a node's subtree ends where its last
+            #descendant's does, and its children are seen right to left
+            p = parent[i]
+            if p not in last_child:
+                last_child[p] = i
+                self.subtree_end[p] = self.subtree_end[i]
+            else:
+                self.next_sibling[i] = self.first_child[p]
+            self.first_child[p] = i
+        is_leaf = self.first_child == -1
+        self.leaf_nodes = np.flatnonzero(is_leaf).astype(np.int32)
+        leaves_before = np.concatenate(([0], np.cumsum(is_leaf))).astype(np.int32)
+        self.leaf_start = leaves_before[:-1]
+        self.leaf_end = leaves_before[self.subtree_end]
+        self.words = [words[i] for i in self.leaf_nodes]
+        self._scores = None
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def scores(self):
+        #nodal and leaf yngve/frazier scores of every node, computed together
+        #the first time any of them is needed
+        if self._scores is None:
+            n = len(self)
+            parent = self.parent
+            child_counts = np.bincount(parent[1:], minlength=n)
+            #Siblings appear in preorder from left to right, so a stable sort
+            #by parent gives each node's rank among its siblings
+            order = np.argsort(parent[1:], kind='stable') + 1
+            group_start = np.concatenate(([0], np.cumsum(child_counts)))
+            rank = np.zeros(n, dtype=np.int32)
+            rank[order] = np.arange(n - 1) - group_start[parent[order]]
+            nodal_yngve = np.zeros(n, dtype=np.int64)
+            nodal_yngve[1:] = child_counts[parent[1:]] - 1 - rank[1:]
+            s_id = NODE_TYPE_IDS.get('S', -1)
+            nodal_frazier = np.zeros(n)
+            nodal_frazier[1:] = np.where(
+                    rank[1:] == 0,
+                    np.where(self.type_ids[parent[1:]] == s_id, 1.5, 1), 0)
+            #Parents precede their children, so one forward sweep accumulates
+            #the scores of every ancestor
+            leaf_yngve = nodal_yngve.tolist()
+            leaf_frazier = nodal_frazier.tolist()
+            parents = parent.tolist()
+            for i in range(1, n):
+                leaf_yngve[i] += leaf_yngve[parents[i]]
+                if leaf_frazier[i]:
+                    leaf_frazier[i] += leaf_frazier[parents[i]]
+            leaf_yngve = np.array(leaf_yngve, dtype=np.int64)
+            leaf_frazier = np.array(leaf_frazier)
+            leaves = self.leaf_nodes
+            is_clause = (self.type_ids == s_id).astype(np.int64)
+            self._scores = {
+                    'nodal_yngve': nodal_yngve,
+                    'nodal_frazier': nodal_frazier,
+                    'leaf_yngve': leaf_yngve,
+                    'leaf_frazier': leaf_frazier,
+                    'yngve_prefix': np.concatenate(([0], np.cumsum(leaf_yngve[leaves]))),
+                    'frazier_prefix': np.concatenate(([0], np.cumsum(leaf_frazier[leaves]))),
+                    'clause_prefix': np.concatenate(([0], np.cumsum(is_clause))),
+            }
+        return self._scores
+
+
+class CompactConstituencyTree:
+    #A view of one node of a TreeArrays. The root of a tree is index 0.
+    #_pos_counts holds its default part of speech counts once they are known.
+    __slots__ = ('arrays', 'index', '_pos_counts')
+
+    def __init__(self, arrays, index=0):
+        self.arrays = arrays
+        self.index = index
+
+    @classmethod
+    def from_tree(cls, tree):
+        #Packs a depth.ConstituencyTree, or any node with the same attributes
+        nodes = tree.preorder()
+        positions = {id(node): i for i, node in enumerate(nodes)}
+        parent = [-1] + [positions[id(node.parent)] for node in nodes[1:]]
+        return cls(TreeArrays(
+                parent, [intern_node_type(node.node_type) for node in nodes],
+                [node.word for node in nodes]))
+
+    @classmethod
+    def from_hierplane(cls, parse_dict):
+        #Packs an allennlp hierplane constituency tree directly
+        parent, type_ids, words = [], [], []
+        stack = [(parse_dict, -1)]
+        while stack:
+            node_dict, parent_index = stack.pop()
+            index = len(parent)
+            parent.append(parent_index)
+            type_ids.append(intern_node_type(node_dict['nodeType']))
+            if 'children' in node_dict.keys():
+                words.append(None)
+                stack.extend((child, index) for child in reversed(node_dict['children']))
+            else:
+                words.append(node_dict['word'])
+        return cls(TreeArrays(parent, type_ids, words))
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactConstituencyTree)
+                and self.arrays is other.arrays and self.index == other.index)
+
+    def __hash__(self):
+        return hash((id(self.arrays), self.index))
+
+    def __repr__(self):
+        reprs = {}
+        for node in reversed(self.preorder()):
+            inner = node.word if node.word else ''.join(
+                    [f'<li>{reprs.pop(child.index)}</li>' for child in node.children]
+                    )
+            reprs[node.index] = f'<ol>{node.node_type}: {inner}</ol>'
+        return reprs[self.index]
+
+    def _node(self, index):
+        return CompactConstituencyTree(self.arrays, int(index))
+
+    @property
+    def id(self):
+        return self.index
+
+    @property
+    def node_type(self):
+        return NODE_TYPES[self.arrays.type_ids[self.index]]
+
+    @property
+    def is_leaf(self):
+        return self.arrays.first_child[self.index] == -1
+
+    @property
+    def word(self):
+        if not self.is_leaf:
+            return None
+        return self.arrays.words[self.arrays.leaf_start[self.index]]
+
+    @property
+    def parent(self):
+        index = self.arrays.parent[self.index]
+        return None if index == -1 else self._node(index)
+
+    @property
+    def root(self):
+        return self._node(0)
+
+    @property
+    def children(self):
+        children = []
+        child = self.arrays.first_child[self.index]
+        while child != -1:
+            children.append(self._node(child))
+            child = self.arrays.next_sibling[child]
+        return children
+
+    def preorder(self):
+        return [self._node(i) for i in
+                range(self.index, self.arrays.subtree_end[self.index])]
+
+    @property
+    def _leaf_span(self):
+        return slice(self.arrays.leaf_start[self.index], self.arrays.leaf_end[self.index])
+
+    @property
+    def leaves(self):
+        return [self._node(i) for i in self.arrays.leaf_nodes[self._leaf_span]]
+
+    @property
+    def words(self):
+        return ' '.join(self.arrays.words[self._leaf_span])
+
+    @property
+    def total_words(self):
+        return int(self.arrays.leaf_end[self.index] - self.arrays.leaf_start[self.index])
+
+    @property
+    def nodal_yngve(self):
+        return int(self.arrays.scores['nodal_yngve'][self.index])
+
+    @property
+    def leaf_yngve(self):
+        return int(self.arrays.scores['leaf_yngve'][self.index])
+
+    @property
+    def nodal_frazier(self):
+        return _number(self.arrays.scores['nodal_frazier'][self.index])
+
+    @property
+    def leaf_frazier(self):
+        return _number(self.arrays.scores['leaf_frazier'][self.index])
+
+    @property
+    def num_clauses(self):
+        prefix = self.arrays.scores['clause_prefix']
+        return int(prefix[self.arrays.subtree_end[self.index]] - prefix[self.index])
+
+    @property
+    def total_Ydepth(self):
+        prefix = self.arrays.scores['yngve_prefix']
+        return int(prefix[self.arrays.leaf_end[self.index]]
+                   - prefix[self.arrays.leaf_start[self.index]])
+
+    @property
+    def total_Fdepth(self):
+        prefix = self.arrays.scores['frazier_prefix']
+        return _number(prefix[self.arrays.leaf_end[self.index]]
+                       - prefix[self.arrays.leaf_start[self.index]])
+
+    @property
+    def mean_Ydepth(self):
+        return self.total_Ydepth / self.total_words
+
+    @property
+    def mean_Fdepth(self):
+        return self.total_Fdepth / self.total_words
+
+    @property
+    def max_Ydepth(self):
+        leaves = self.arrays.leaf_nodes[self._leaf_span]
+        return int(self.arrays.scores['leaf_yngve'][leaves].max())
+
+    @property
+    def max_Fdepth(self):
+        leaves = self.arrays.leaf_nodes[self._leaf_span]
+        return _number(self.arrays.scores['leaf_frazier'][leaves].max())
+
+    def parts_of_speech(self, table=None):
+        #Counts the leaves in each part of speech category of table, like
+        #ConstituencyTree.tally_parts_of_speech, straight from the interned
+        #node type ids of the leaves
+        table = table or pos_tally.DEFAULT_TABLE
+        if table is pos_tally.DEFAULT_TABLE:
+            return dict(self._default_parts_of_speech())
+        counts = pos_tally.count_trees([self], table)[0].tolist()
+        return dict(zip(table.names, counts))
+
+    def tally_parts_of_speech(self, table=None):
+        return self.parts_of_speech(table)
+
+    def keep_parts_of_speech(self, counts):
+        #Keeps the default counts, for example those of a batch tally, for
+        #the *_count properties
+        self._pos_counts = counts
+
+    def _default_parts_of_speech(self):
+        if not hasattr(self, '_pos_counts'):
+            counts = pos_tally.count_trees([self])[0].tolist()
+            self._pos_counts = dict(zip(pos_tally.DEFAULT_TABLE.names, counts))
+        return self._pos_counts
+
+    @property
+    def verb_count(self):
+        return self._default_parts_of_speech()['verb_count']
+
+    @property
+    def adj_count(self):
+        return self._default_parts_of_speech()['adj_count']
+
+    @property
+    def noun_count(self):
+        return self._default_parts_of_speech()['noun_count']
+
+    @property
+    def adverb_count(self):
+        return self._default_parts_of_speech()['adverb_count']
+
+    @property
+    def det_count(self):
+        return self._default_parts_of_speech()['det_count']
+
+    @property
+    def personal_pronoun_count(self):
+        return self._default_parts_of_speech()['personal_pronoun_count']
+
+    @property
+    def conj_count(self):
+        return self._default_parts_of_speech()['conj_count']
+
+    @property
+    def prep_count(self):
+        return self._default_parts_of_speech()['prep_count']
+
+    @property
+    def properN_count(self):
+        return self._default_parts_of_speech()['properN_count']
+
+    #The graph drawing of ConstituencyTree only uses the properties above
+    def frazier_yngve_graph(self, dot=None, parent=None,
+                            leaf_graph=None, path=None, view=False):
+        import depth
+        return depth.ConstituencyTree.frazier_yngve_graph(
+                self, dot, parent, leaf_graph, path, view)
+
+    def frazier_yngve_digraph(self):
+        import depth
+        return depth.ConstituencyTree.frazier_yngve_digraph(self)
+
+    def add_to_digraph(self, dot, leaf_graph, parent=None):
+        import depth
+        return depth.ConstituencyTree.add_to_digraph(self, dot, leaf_graph, parent)
+
+
+def _number(value):
+    #Frazier scores are halves, so whole values read back as ints like the
+    #scores of ConstituencyTree do
+    value = float(value)
+    return int(value) if value.is_integer() else value
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dependency statistics for corpora with gold CoNLL-U annotations.
+
+iter_conllu_trees streams the files with conllu.parse_incr and builds a
+DependencyTree for every sentence. iter_conllu_statistics is the metric-only
+fast path: it reads just the ID and HEAD columns, and computes the SynDepLen
+statistics of batch_size sentences at a time in one vectorized step, so
+millions of sentences can be processed without the neural models or any
+per-sentence objects. Rows have the same fields as get_paragraph_statistics;
+the constituency fields, which CoNLL-U does not annotate, are None, as are
+the SynDepLen fields of sentences without any dependency relation.
+
+The fast path reads the two columns itself because conllu.parse_incr, which
+parses every field of every token, takes several times as long. Its
+lengths are reduced by DependencyTree.reduce_SynDepLen, the same reduction
+as DependencyTree.batch_SynDepLen, so both paths give the same numbers.
+"""
+from itertools import islice
+
+import numpy as np
+from conllu import parse_incr
+
+from depth import STATISTICS_FIELDS, DependencyTree
+
+
+def _sources(sources):
+    if isinstance(sources, str) or hasattr(sources, 'read'):
+        return [sources]
+    return sources
+
+
+def _token_lists(sources):
+    for source in _sources(sources):
+        if isinstance(source, str):
+            with open(source, encoding='utf-8') as f:
+                yield from parse_incr(f)
+        else:
+            yield from parse_incr(source)
+
+
+def dependency_tree(token_list):
+    #Builds a DependencyTree from one CoNLL-U sentence. Multiword token
+    #ranges and empty nodes are left out, and so is the root relation, as in
+    #the allennlp conversion, which gives None for a sentence with no other
+    #relation.
+    words = [token for token in token_list if isinstance(token['id'], int)]
+    positions = {token['id']: i for i, token in enumerate(words)}
+    relations = [(token, words[positions[token['head']]]) for token in words
+                 if token['head'] and token['head'] in positions]
+    if not relations:
+        return None
+    return DependencyTree.from_columns(
+            [head['form'] for _, head in relations],
+            [positions[head['id']] for _, head in relations],
+            [token['deprel'] for token, _ in relations],
+            [token['form'] for token, _ in relations],
+            [positions[token['id']] for token, _ in relations])
+
+
+def iter_conllu_trees(sources):
+    #Yields (sentence text, DependencyTree or None) for every sentence of one
+    #or more CoNLL-U files, given as paths or open files
+    for token_list in _token_lists(sources):
+        text = token_list.metadata.get('text') or ' '.join(
+                token['form'] for token in token_list if isinstance(token['id'], int))
+        yield text, dependency_tree(token_list)
+
+
+def _sentence_lengths(sources):
+    #Yields (text, dependency lengths) for every sentence, reading the
+    #CoNLL-U lines directly. Word IDs are consecutive, so the distance
+    #between a word's ID and its head's ID is its dependency length.
+    for source in _sources(sources):
+        f = open(source, encoding='utf-8') if isinstance(source, str) else source
+        try:
+            text, forms, lengths = None, [], []
+            for line in f:
+                line = line.rstrip('\n')
+                if not line.strip():
+                    if forms:
+                        yield text or ' '.join(forms), lengths
+                    text, forms, lengths = None, [], []
+                elif line.startswith('#'):
+                    if line.startswith('# text = '):
+                        text = line[len('# text = '):]
+                else:
+                    columns = line.split('\t')
+                    if not columns[0].isdigit():
+                        #multiword token ranges and empty nodes
+                        continue
+                    forms.append(columns[1])
+                    head = columns[6]
+                    if head.isdigit() and head != '0':
+                        lengths.append(abs(int(columns[0]) - int(head)))
+            if forms:
+                yield text or ' '.join(forms), lengths
+        finally:
+            if isinstance(source, str):
+                f.close()
+
+
+def iter_conllu_statistics(sources, batch_size=10000):
+    #Yields a statistics row for every sentence of the CoNLL-U sources, with
+    #sentenceID counting sentences across all of them
+    sentences = _sentence_lengths(sources)
+    start = 0
+    empty = dict.fromkeys(STATISTICS_FIELDS)
+    while True:
+        batch = list(islice(sentences, batch_size))
+        if not batch:
+            return
+        sizes = np.array([len(lengths) for _, lengths in batch], dtype=np.int64)
+        lengths = np.fromiter((length for _, sentence_lengths in batch
+                               for length in sentence_lengths),
+                              dtype=np.int64, count=int(sizes.sum()))
+        reduced = DependencyTree.reduce_SynDepLen(lengths, sizes)
+        totals = reduced['total_SynDepLen'].tolist()
+        means = reduced['mean_SynDepLen'].tolist()
+        maxima = reduced['max_SynDepLen'].tolist()
+        for i, (text, _) in enumerate(batch):
+            has_relations = maxima[i] >= 0
+            yield {
+                    **empty,
+                    'sentence_text': text,
+                    'mean_SynDepLen': means[i] if has_relations else None,
+                    'total_SynDepLen': totals[i] if has_relations else None,
+                    'max_SynDepLen': maxima[i] if has_relations else None,
+                    'sentenceID': start + i,
+            }
+        start += len(batch)
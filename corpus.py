@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs the statistics of depth.py over many files or sentences with a pool of
+worker processes.
+
+Every worker loads the sentence splitter and both parsers once when it
+starts, then handles as many jobs as it is given. Results are always returned
+in input order, so the output does not depend on which worker finished first.
+
+Each worker limits torch to threads intra-op threads. By default this is
+CLAS_TORCH_THREADS, or else the machine's cores divided between the workers,
+so that the workers do not compete for the same cores.
+
+While an instrumentation Collector is active in the parent, each job is run
+under a Collector of its own in the worker and its records are merged into
+the parent's as the job returns.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+
+def _init_worker(threads=None):
+    #Each worker loads the spaCy splitter and both AllenNLP models once,
+    #instead of once per job
+    import inference
+    import models
+    inference.configure(threads=threads)
+    models.preload()
+
+
+def _worker_threads(workers, threads):
+    import inference
+    if threads is None:
+        threads = inference.settings()['threads']
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+    return threads
+
+
+def _process_manual_file(job):
+    import depth
+    path, dirname = job
+    return depth.process_manual_file(path, dirname)
+
+
+def _checked_process_manual_file(job):
+    #Returns (table, None), or (None, traceback) if the file failed
+    import traceback
+    try:
+        return _process_manual_file(job), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _sentence_chunk_statistics(job):
+    import depth
+    sentences, engine, start, dependency_engine = job
+    return depth.sentence_chunk_statistics(sentences, engine, start, dependency_engine)
+
+
+def _collected(function, job, collect):
+    #Runs function(job) in a worker and, if the parent is collecting
+    #instrumentation, returns the stages it recorded with its result
+    if not collect:
+        return function(job), None
+    with instrumentation.Collector() as collector:
+        result = function(job)
+    return result, collector.export()
+
+
+def _merged(outputs):
+    #The results of _collected jobs, merging their records in this process
+    for result, records in outputs:
+        instrumentation.merge(records)
+        yield result
+
+
+def manual_statistics(paths, dirnames, workers, threads=None):
+    #Runs depth.process_manual_file for every path, one file per job, and
+    #yields the sentence pairs of each file in the order of paths as files
+    #finish
+    jobs = list(zip(paths, dirnames))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(_worker_threads(workers, threads),)) as pool:
+        yield from _merged(pool.map(_collected, [_process_manual_file] * len(jobs), jobs,
+                                    [instrumentation.collecting()] * len(jobs)))
+
+
+def checked_manual_statistics(paths, dirnames, workers=1, threads=None):
+    #Yields (index, table, traceback) for every path as soon as it is
+    #finished, in whatever order that is. A file that fails has table None
+    #and does not stop the others.
+    jobs = list(zip(paths, dirnames))
+    if workers <= 1:
+        for i, job in enumerate(jobs):
+            yield (i,) + _checked_process_manual_file(job)
+        return
+    from concurrent.futures import as_completed
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(_worker_threads(workers, threads),)) as pool:
+        collect = instrumentation.collecting()
+        futures = {pool.submit(_collected, _checked_process_manual_file, job, collect): i
+                   for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result, records = future.result()
+            instrumentation.merge(records)
+            yield (futures[future],) + result
+
+
+def sentence_statistics(sentences, engine='allennlp', workers=2, chunk_size=16,
+                        threads=None, dependency_engine=None):
+    #Splits already separated sentences into chunks of chunk_size, parses the
+    #chunks in parallel and returns one row per sentence ordered by sentenceID
+    jobs = [(sentences[i:i + chunk_size], engine, i, dependency_engine)
+            for i in range(0, len(sentences), chunk_size)]
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(_worker_threads(workers, threads),)) as pool:
+        for chunk in _merged(pool.map(_collected, [_sentence_chunk_statistics] * len(jobs),
+                                      jobs, [instrumentation.collecting()] * len(jobs))):
+            rows.extend(chunk)
+    return rows
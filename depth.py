@@ -5,21 +5,31 @@ Created on Fri Feb 28 14:57:54 2020
 
 @author: Lab
 """
-from graphviz import Digraph
-import spacy
 import re
-from manual_parse import constituency_parse, dependency_parse
 import os
-from PyPDF2 import PdfFileMerger
-import pandas as pd
+import io
+import hashlib
+import numpy as np
+import inference
+import instrumentation
+import models
+import parse_cache
+import pos_tally
+import stats_schema
+from itertools import islice
+from sinks import CSVSink, pipe_table
+from splitting import parsed_spans, split_sentences
 
-sentence_splitter = spacy.load('en_core_web_sm')
+#Models are loaded by the models registry on first use, so importing this
+#module for tree metrics alone does not load spaCy or AllenNLP.
+#depth.sentence_splitter is kept as a lazily loaded alias.
+def __getattr__(name):
+    if name == 'sentence_splitter':
+        return models.get('sentence_splitter')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class ConstituencyTree:
-    ID_NO = 0
     def __init__(self, node_type, children=None, word=None):
-        self.id = ConstituencyTree.ID_NO
-        ConstituencyTree.ID_NO += 1
         #Node type is whether a node is an S, NP, JJ, etc.
         self.node_type = node_type
         self.children = children
@@ -37,39 +47,53 @@ class ConstituencyTree:
     
     def __repr__(self):
         #The repr displays as a nested list if pasted into a browser
-        inner = self.word if self.word else ''.join(
-                [f'<li>{child}</li>' for child in self.children]
-                )
-        return f'<ol>{self.node_type}: {inner}</ol>'
+        #It is built bottom up without recursion so that very deep trees print
+        reprs = {}
+        for node in reversed(self.preorder()):
+            inner = node.word if node.word else ''.join(
+                    [f'<li>{reprs.pop(child.id)}</li>' for child in node.children]
+                    )
+            reprs[node.id] = f'<ol>{node.node_type}: {inner}</ol>'
+        return reprs[self.id]
     
     def frazier_yngve_graph(self, dot = None, parent = None, 
                             leaf_graph = None, path = None, view=False):
         #This generates a graph of the constituency tree with frazier and yngve score details.
-        final = True
-        if not dot:
-            dot = Digraph()
-            dot.graph_attr['rankdir'] = 'BT'
-            leaf_graph = Digraph(name='leaves')
-            leaf_graph.graph_attr['rank'] = 'min'
-        else:
-            final = False
-        content = f'''{self.node_type}: {self.word}
-            {self.leaf_yngve}|{self.leaf_frazier}''' \
-            if self.is_leaf else f'''{self.node_type}
-            {self.nodal_yngve}|{self.nodal_frazier}'''
-        dot.node(str(self.id), content)
-        if parent:
-            dot.edge(str(self.id), str(parent))
-        if not self.is_leaf:
-            for child in self.children:
-                child.frazier_yngve_graph(dot, self.id, leaf_graph=leaf_graph)
-        if self.is_leaf:
-            leaf_graph.node(str(self.id), content)
-        if final:
-            dot.subgraph(leaf_graph)
-            if not path:
-                path = self.words + '_ct.gz'
-            dot.render(path, view=view)
+        if dot:
+            #Draws this subtree into a graph that is being built elsewhere
+            self.add_to_digraph(dot, leaf_graph, parent)
+            return
+        dot = self.frazier_yngve_digraph()
+        if not path:
+            path = self.words + '_ct.gz'
+        dot.render(path, view=view)
+
+    def frazier_yngve_digraph(self):
+        #The graphviz Digraph drawn by frazier_yngve_graph, without rendering it
+        from graphviz import Digraph
+        dot = Digraph()
+        dot.graph_attr['rankdir'] = 'BT'
+        leaf_graph = Digraph(name='leaves')
+        leaf_graph.graph_attr['rank'] = 'min'
+        self.add_to_digraph(dot, leaf_graph)
+        dot.subgraph(leaf_graph)
+        return dot
+
+    def add_to_digraph(self, dot, leaf_graph, parent=None):
+        stack = [(self, parent)]
+        while stack:
+            node, parent_id = stack.pop()
+            content = f'''{node.node_type}: {node.word}
+            {node.leaf_yngve}|{node.leaf_frazier}''' \
+                if node.is_leaf else f'''{node.node_type}
+            {node.nodal_yngve}|{node.nodal_frazier}'''
+            dot.node(str(node.id), content)
+            if parent_id is not None:
+                dot.edge(str(node.id), str(parent_id))
+            if node.is_leaf:
+                leaf_graph.node(str(node.id), content)
+            else:
+                stack.extend((child, node.id) for child in reversed(node.children))
     
     @property
     def words(self):
@@ -77,37 +101,104 @@ class ConstituencyTree:
             self._words = ' '.join([leaf.word for leaf in self.leaves])
         return self._words
 
+    @property
+    def id(self):
+        #Ids number the nodes of each tree separately, in preorder from the root
+        if not hasattr(self, '_id'):
+            for i, node in enumerate(self.root.preorder()):
+                node._id = i
+        return self._id
+
+    def compact(self):
+        #Packs this tree into the array-backed representation of compact_tree
+        from compact_tree import CompactConstituencyTree
+        return CompactConstituencyTree.from_tree(self.root)
+
+    @property
+    def root(self):
+        handle = self
+        while handle.parent:
+            handle = handle.parent
+        return handle
+
+    def preorder(self):
+        #All nodes of this subtree, parents before children and left to right
+        nodes = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            if node.children:
+                stack.extend(reversed(node.children))
+        return nodes
+
+    def compute_depths(self):
+        #Computes every score of the tree this node belongs to in a single
+        #top-down pass from the root followed by a single bottom-up pass,
+        #without recursion. The per-node properties below only read its results.
+        root = self.root
+        root._nodal_yngve = 0
+        root._nodal_frazier = 0
+        root._leaf_yngve = 0
+        root._leaf_frazier = 0
+        nodes = root.preorder()
+        for node in nodes:
+            if not node.children:
+                continue
+            last = len(node.children) - 1
+            first_frazier = 1.5 if node.node_type == 'S' else 1
+            for i, child in enumerate(node.children):
+                #nodal yngve counts the siblings to the right, nodal frazier is
+                #nonzero only for the leftmost child
+                child._nodal_yngve = last - i
+                child._leaf_yngve = child._nodal_yngve + node._leaf_yngve
+                if i == 0:
+                    child._nodal_frazier = first_frazier
+                    #A frazier chain stops at the first ancestor scoring 0
+                    child._leaf_frazier = first_frazier + node._leaf_frazier
+                else:
+                    child._nodal_frazier = 0
+                    child._leaf_frazier = 0
+        for node in reversed(nodes):
+            is_clause = 1 if node.node_type == 'S' else 0
+            if node.is_leaf:
+                node._num_clauses = is_clause
+                node._total_Ydepth = node._leaf_yngve
+                node._total_Fdepth = node._leaf_frazier
+                node._max_Ydepth = node._leaf_yngve
+                node._max_Fdepth = node._leaf_frazier
+            else:
+                children = node.children
+                node._num_clauses = sum(
+                        [child._num_clauses for child in children]) + is_clause
+                node._total_Ydepth = sum(
+                        [child._total_Ydepth for child in children])
+                node._total_Fdepth = sum(
+                        [child._total_Fdepth for child in children])
+                node._max_Ydepth = max(
+                        [child._max_Ydepth for child in children])
+                node._max_Fdepth = max(
+                        [child._max_Fdepth for child in children])
+
     @property
     def nodal_yngve(self):
         #This is equivalent to how many places to the left of the rightmost node
         #A given node is among its siblings, starting at 0
         if not hasattr(self, '_nodal_yngve'):
-            if self.parent:
-                for i, child in enumerate(self.parent.children[::-1]):
-                    child._nodal_yngve = i
-            else:
-                self._nodal_yngve = 0
+            self.compute_depths()
         return self._nodal_yngve
     
     @property
     def leaf_yngve(self):
         #This is the sum of the nodal_yngve scores of a node and all of its ancestors
         if not hasattr(self, '_leaf_yngve'):
-            self._leaf_yngve = self.nodal_yngve
-            handle = self
-            while handle.parent:
-                self._leaf_yngve += handle.parent.nodal_yngve
-                handle = handle.parent
+            self.compute_depths()
         return self._leaf_yngve
     
     @property
     def leaves(self):
         if not hasattr(self, '_leaves'):
-            if self.is_leaf:
-                self._leaves = [self]
-            else:
-                self._leaves = [leaf for child in self.children 
-                                for leaf in child.leaves]
+            self._leaves = [node for node in self.preorder() if node.is_leaf]
         return self._leaves
             
     @property
@@ -115,16 +206,7 @@ class ConstituencyTree:
         #This is 0 if a node is not the leftmost of its siblings, 1.5 if it is
         #and is the child of an S node, and 1 otherwise
         if not hasattr(self, '_nodal_frazier'):
-            if self.parent:
-                if self.parent.children.index(self) == 0:
-                    if self.parent.node_type == "S":
-                        self._nodal_frazier = 1.5
-                    else:
-                        self._nodal_frazier = 1
-                else:
-                    self._nodal_frazier = 0
-            else:
-                self._nodal_frazier = 0
+            self.compute_depths()
         return self._nodal_frazier
     
     @property
@@ -132,25 +214,13 @@ class ConstituencyTree:
         #This is the sum of the node and all of its ancestors' nodal frazier scores
         #Stopping when an ancester with nodal score of 0 is reached
         if not hasattr(self, '_leaf_frazier'):
-            self._leaf_frazier = self.nodal_frazier
-            if self._leaf_frazier == 0:
-                return self._leaf_frazier
-            handle = self
-            while handle.parent:
-                if handle.parent.nodal_frazier == 0: break
-                self._leaf_frazier += handle.parent.nodal_frazier
-                handle = handle.parent
+            self.compute_depths()
         return self._leaf_frazier
     
     @property
     def num_clauses(self):
         if not hasattr(self, '_num_clauses'):
-            is_clause = 1 if self.node_type == 'S' else 0
-            if self.children:
-                self._num_clauses = sum([child.num_clauses for child
-                                      in self.children]) + is_clause
-            else:
-                self._num_clauses = is_clause
+            self.compute_depths()
         return self._num_clauses
     
     @property
@@ -212,38 +282,40 @@ class ConstituencyTree:
         return self._properN_count
                     
     
-    def tally_parts_of_speech(self):
-        self._noun_count, self._adj_count, self._adverb_count, \
-            self._verb_count, self._det_count, self._personal_pronoun_count,\
-            self._conj_count, self._prep_count, self._properN_count \
-            = 0, 0, 0, 0, 0, 0, 0, 0, 0
-        type_dict = {'V': '_verb_count',
-                     'JJ': '_adj_count',
-                     'N': '_noun_count',
-                     'RB': '_adverb_count',
-                     'DT': '_det_count',
-                     'PRP': '_personal_pronoun_count',
-                     'CC': '_conj_count',
-                     'IN': '_prep_count',
-                     'NNP': '_properN_count',
-        }
-        for leaf in self.leaves:
-            for k, v in type_dict.items():
-                if leaf.node_type.startswith(k):
-                    setattr(self, v, getattr(self, v) + 1)
+    def tally_parts_of_speech(self, table=None):
+        #Counts the leaves in each part of speech category of table, by
+        #default that of the statistics, and returns the counts by name
+        return ConstituencyTree.tally_parts_of_speech_batch([self], table)[0]
+
+    @staticmethod
+    def tally_parts_of_speech_batch(trees, table=None):
+        #Counts the parts of speech of many trees with one bincount over all
+        #of their leaves (see pos_tally.py). The default counts are also
+        #kept on each tree for its *_count properties.
+        table = table or pos_tally.DEFAULT_TABLE
+        counts = pos_tally.count_trees(trees, table).tolist()
+        tallies = [dict(zip(table.names, row)) for row in counts]
+        if table is pos_tally.DEFAULT_TABLE:
+            for tree, tally in zip(trees, tallies):
+                if isinstance(tree, ConstituencyTree):
+                    for name, count in tally.items():
+                        setattr(tree, '_' + name, count)
+                elif hasattr(tree, 'keep_parts_of_speech'):
+                    tree.keep_parts_of_speech(tally)
+        return tallies
     
     @property
     def total_Ydepth(self):
         #Sum of the leaf yngve scores of all of the leaves in this tree
         if not hasattr(self, '_total_Ydepth'):
-            self._total_Ydepth = sum([leaf.leaf_yngve for leaf in self.leaves])
+            self.compute_depths()
         return self._total_Ydepth
 
     @property
     def total_Fdepth(self):
         #Sum of the leaf frazier scores of all of the leaves in this tree
         if not hasattr(self, '_total_Fdepth'):
-            self._total_Fdepth =  sum([leaf.leaf_frazier for leaf in self.leaves])
+            self.compute_depths()
         return self._total_Fdepth
     
     @property
@@ -258,11 +330,15 @@ class ConstituencyTree:
     
     @property
     def max_Ydepth(self):
-        return max([leaf.leaf_yngve for leaf in self.leaves])
+        if not hasattr(self, '_max_Ydepth'):
+            self.compute_depths()
+        return self._max_Ydepth
     
     @property
     def max_Fdepth(self):
-        return max([leaf.leaf_frazier for leaf in self.leaves])
+        if not hasattr(self, '_max_Fdepth'):
+            self.compute_depths()
+        return self._max_Fdepth
 
     @staticmethod
     def constituency_parse(sentence, engine='allennlp'):
@@ -272,36 +348,69 @@ class ConstituencyTree:
                 engine
                 ](sentence)
     
+    @staticmethod
+    def constituency_parse_batch(sentences, engine='allennlp', batch_size=32, max_tokens=None):
+        #Generates constituency parse trees for many sentences at once, which
+        #lets the engine amortize its setup over the whole batch
+        return {'allennlp': ConstituencyTree.allen_constituency_parse_batch}[
+                engine
+                ](sentences, batch_size, max_tokens)
+
     @classmethod
-    def allen_constituency_parse(cls, sentence):
+    def allen_constituency_parse_batch(cls, sentences, batch_size=32, max_tokens=None):
         import allen_constituency_parse
+        #Previously parsed sentences are served from the parse cache, and only
+        #the rest are sent to the parser
+        hierplane_trees = parse_cache.cached_parse(
+                sentences, 'allennlp-constituency',
+                inference.cache_archive(allen_constituency_parse.ARCHIVE, 'constituency'),
+                lambda missing: [output['hierplane_tree'] for output in
+                    allen_constituency_parse.constituency_parse_batch(
+                        missing, batch_size, max_tokens)])
+        with instrumentation.stage('convert_constituency', sentences=len(hierplane_trees)):
+            return [ConstituencyTree.allen_constituency_process(tree['root'])
+                    for tree in hierplane_trees]
+    
+    @classmethod
+    def allen_constituency_parse(cls, sentence):
         #Generates the allennlp parse tree. This parse tree requires further
         #translation to create an instance of the ConstituencyTree class
-        return ConstituencyTree.allen_constituency_process(
-                    allen_constituency_parse.constituency_parse(sentence)[
-                    'hierplane_tree'
-                    ]['root']
-                )
+        return cls.allen_constituency_parse_batch([sentence])[0]
     
     @classmethod
     def allen_constituency_process(cls, parse_dict):
         #Translates the allennlp constituency parsetree into a Constituency
-        #Tree instance
-        node_type = parse_dict['nodeType']
-        children = None
-        if 'children' in parse_dict.keys():
-            children = []
-            for child in parse_dict['children']:
-                children.append(cls.allen_constituency_process(child))
-        else:
-            return ConstituencyTree(node_type, children, parse_dict['word'])
-        return ConstituencyTree(node_type, children)
+        #Tree instance. Children are built before their parents using an
+        #explicit stack, so arbitrarily deep parses do not hit the recursion limit.
+        built = []
+        stack = [(parse_dict, False)]
+        while stack:
+            node_dict, expanded = stack.pop()
+            node_type = node_dict['nodeType']
+            if 'children' not in node_dict.keys():
+                built.append(ConstituencyTree(node_type, None, node_dict['word']))
+            elif expanded:
+                count = len(node_dict['children'])
+                children = built[len(built) - count:]
+                del built[len(built) - count:]
+                built.append(ConstituencyTree(node_type, children))
+            else:
+                stack.append((node_dict, True))
+                stack.extend((child, False) for child in reversed(node_dict['children']))
+        return built[0]
 
 
 class DependencyTree:
-    #this class represents itself as a list of relations with no further structure
+    #this class represents itself as columns of relations with no further structure:
+    #the head and tail word positions are NumPy arrays, and the words and
+    #relation types are lists in the same order
     def __init__(self):
-        self.relations = []
+        self.head_words = []
+        self.tail_words = []
+        self.relation_types = []
+        self._head_pos = []
+        self._tail_pos = []
+        self._columns = None
         self.start_positions = []
     
     def __repr__(self):
@@ -311,287 +420,682 @@ class DependencyTree:
             tail: {r['tail']} @ {r['tail_pos']}'''
                 for r in self.relations])
         return f'<ul>{inner}</ul>'
+
+    @property
+    def columns(self):
+        #head positions, tail positions and dependency lengths as arrays,
+        #rebuilt only after relations have been added
+        if self._columns is None:
+            head_pos = np.array(self._head_pos, dtype=np.int64)
+            tail_pos = np.array(self._tail_pos, dtype=np.int64)
+            self._columns = head_pos, tail_pos, np.abs(head_pos - tail_pos)
+        return self._columns
+
+    @property
+    def head_positions(self):
+        return self.columns[0]
+
+    @property
+    def tail_positions(self):
+        return self.columns[1]
+
+    @property
+    def lengths(self):
+        #The length of each relation is the distance between its head and tail
+        return self.columns[2]
+
+    @property
+    def relations(self):
+        return [{
+                'head': head,
+                'head_pos': head_pos,
+                'relation_type': relation_type,
+                'tail': tail,
+                'tail_pos': tail_pos
+                } for head, head_pos, relation_type, tail, tail_pos in zip(
+                    self.head_words, self._head_pos, self.relation_types,
+                    self.tail_words, self._tail_pos)]
     
     @property
     def words(self):
         if not hasattr(self, '_words'):
-            max_ = 0
-            for r in self.relations:
-                if r['head_pos'] > max_: max_ = r['head_pos']
-                if r['tail_pos'] > max_: max_ = r['tail_pos']
-            self._words = [''] * (max_ + 1)
-            for r in self.relations:
-                self._words[r['head_pos']] = r['head']
-                self._words[r['tail_pos']] = r['tail']
+            positions = self._head_pos + self._tail_pos
+            self._words = [''] * (max(positions, default=0) + 1)
+            for position, word in zip(positions, self.head_words + self.tail_words):
+                self._words[position] = word
             self._words = ' '.join(self._words)
         return self._words
     
     def graph(self, path=None, view=False):
+        dot = self.digraph()
+        if not path:
+            path = self.words + '_dt.gv'
+        dot.render(path, view=view)
+
+    def digraph(self):
+        #The graphviz Digraph drawn by graph, without rendering it
+        from graphviz import Digraph
         dot = Digraph()
         for r in self.relations:
             dot.node(str(r['head_pos']), r['head'])
             dot.node(str(r['tail_pos']), r['tail'])
             dot.edge(str(r['head_pos']), str(r['tail_pos']), label=r['relation_type'])
-        if not path:
-            path = self.words + '_dt.gv'
-        dot.render(path, view=view)
+        return dot
     
+    @classmethod
+    def from_columns(cls, head_words, head_pos, relation_types, tail_words, tail_pos):
+        #Builds a tree from whole columns at once rather than a relation at a time
+        dependency_tree = cls()
+        dependency_tree.head_words = list(head_words)
+        dependency_tree._head_pos = list(head_pos)
+        dependency_tree.relation_types = list(relation_types)
+        dependency_tree.tail_words = list(tail_words)
+        dependency_tree._tail_pos = list(tail_pos)
+        return dependency_tree
+
     def add(self, head, head_pos, relation_type, tail, tail_pos):
-        self.relations.append({
-                'head': head,
-                'head_pos': head_pos,
-                'relation_type': relation_type,
-                'tail': tail,
-                'tail_pos': tail_pos
-                })
+        self.head_words.append(head)
+        self._head_pos.append(head_pos)
+        self.relation_types.append(relation_type)
+        self.tail_words.append(tail)
+        self._tail_pos.append(tail_pos)
+        self._columns = None
     
     @property
     def total_SynDepLen(self):
         #sum of the length of the relations in this dependency tree
-        if not hasattr(self, '_total_SynDepLen'):
-            self._total_SynDepLen = sum([
-                   abs(r['head_pos'] - r['tail_pos']) for r in self.relations 
-                    ])
-        return self._total_SynDepLen
+        return int(self.lengths.sum())
     
     @property
     def mean_SynDepLen(self):
         #mean length of the relations in this dependency tree
-        return self.total_SynDepLen / len(self.relations)
+        return self.total_SynDepLen / len(self.relation_types)
     
     @property
     def max_SynDepLen(self):
-        if not hasattr(self, '_max_SynDepLen'):
-            self._max_SynDepLen = max([abs(r['head_pos'] - r['tail_pos']) for r in self.relations])
-        return self._max_SynDepLen
+        if not len(self.relation_types):
+            raise ValueError('max_SynDepLen of a dependency tree with no relations')
+        return int(self.lengths.max())
+
+    @property
+    def SynDepLen_by_relation(self):
+        #count, total, mean and max length of the relations of each type
+        types, inverse = np.unique(np.array(self.relation_types, dtype=object),
+                                   return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(types))
+        totals = np.bincount(inverse, weights=self.lengths, minlength=len(types))
+        maxima = np.zeros(len(types), dtype=np.int64)
+        np.maximum.at(maxima, inverse, self.lengths)
+        return {
+                relation_type: {
+                    'count': int(count),
+                    'total': int(total),
+                    'mean': float(total / count),
+                    'max': int(max_),
+                } for relation_type, count, total, max_ in zip(
+                        types, counts, totals, maxima)
+        }
+
+    @staticmethod
+    def batch_SynDepLen(trees):
+        #total, mean and max SynDepLen of many trees at once, as arrays
+        #with one entry per tree. Trees without relations get nan means and
+        #maxima of -1.
+        trees = list(trees)
+        sizes = np.array([len(tree.relation_types) for tree in trees], dtype=np.int64)
+        lengths = np.concatenate([tree.lengths for tree in trees]
+                                 + [np.zeros(0, dtype=np.int64)])
+        return DependencyTree.reduce_SynDepLen(lengths, sizes)
+
+    @staticmethod
+    def reduce_SynDepLen(lengths, sizes):
+        #The reduction of batch_SynDepLen, from the lengths of the relations
+        #of all trees one after another and the number of relations of each
+        #tree. conllu_corpus reads lengths straight from CoNLL-U files and
+        #reduces them here too.
+        sizes = np.asarray(sizes, dtype=np.int64)
+        owners = np.repeat(np.arange(len(sizes)), sizes)
+        totals = np.bincount(owners, weights=lengths,
+                             minlength=len(sizes)).astype(np.int64)
+        maxima = np.full(len(sizes), -1, dtype=np.int64)
+        np.maximum.at(maxima, owners, lengths)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = totals / sizes
+        return {
+                'total_SynDepLen': totals,
+                'mean_SynDepLen': means,
+                'max_SynDepLen': maxima,
+        }
+
+    @staticmethod
+    def batch_SynDepLen_by_relation(trees):
+        #Per-tree, per-relation-type breakdown of many trees at once. Returns
+        #the relation types and two matrices with one row per tree and one
+        #column per type: the number of relations and their total length
+        trees = list(trees)
+        sizes = [len(tree.relation_types) for tree in trees]
+        owners = np.repeat(np.arange(len(trees)), sizes)
+        types, inverse = np.unique(
+                np.array([r for tree in trees for r in tree.relation_types], dtype=object),
+                return_inverse=True)
+        lengths = np.concatenate([tree.lengths for tree in trees]
+                                 + [np.zeros(0, dtype=np.int64)])
+        cells = owners * len(types) + inverse
+        shape = (len(trees), len(types))
+        counts = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+        totals = np.bincount(cells, weights=lengths,
+                             minlength=shape[0] * shape[1]).reshape(shape)
+        return list(types), counts, totals.astype(np.int64)
     
     @staticmethod
     def dependency_parse(sentence, engine='allennlp'):
         #generates the dependency tree with a given engine
-        return {'allennlp': DependencyTree.allen_dependency_parse}[
+        return {'allennlp': DependencyTree.allen_dependency_parse,
+                'spacy': DependencyTree.spacy_dependency_parse}[
                 engine
                 ](sentence)
+
+    @staticmethod
+    def dependency_parse_batch(sentences, engine='allennlp'):
+        #Generates the dependency trees of many sentences. The spacy engine
+        #also takes the parsed spaCy Spans of splitting.parsed_spans, and
+        #reuses their parse instead of parsing the sentences again.
+        if engine == 'spacy':
+            return DependencyTree.spacy_dependency_parse_batch(sentences)
+        return [DependencyTree.dependency_parse(str(sentence), engine)
+                for sentence in sentences]
+
+    @classmethod
+    def spacy_dependency_parse(cls, sentence):
+        return cls.spacy_dependency_parse_batch([sentence])[0]
+
+    @classmethod
+    def spacy_dependency_parse_batch(cls, sentences):
+        #Spans that already carry a dependency parse are converted as they
+        #are; the rest go through the splitter's pipeline in one nlp.pipe
+        import splitting
+        sentences = list(sentences)
+        missing = [i for i, sentence in enumerate(sentences)
+                   if isinstance(sentence, str) or not splitting.has_parse(sentence.doc)]
+        if missing:
+            nlp = splitting.get_pipeline(splitting.parser_mode())
+            with instrumentation.stage('spacy_dependency_parse', sentences=len(missing)):
+                docs = nlp.pipe([str(sentences[i]) for i in missing])
+                for i, doc in zip(missing, docs):
+                    sentences[i] = doc[:]
+        with instrumentation.stage('convert_dependency', sentences=len(sentences)):
+            return [cls.spacy_dependency_process(span) for span in sentences]
+
+    @classmethod
+    def spacy_dependency_process(cls, span):
+        #translates the parse of a spaCy Span into an instance of DependencyTree,
+        #with the same word positions and, like allen_dependency_process, None
+        #for a sentence without any relation
+        start = span.start
+        relations = [(token.head.text, token.head.i - start, token.dep_,
+                      token.text, token.i - start)
+                     for token in span if token.head.i != token.i]
+        if not relations:
+            return None
+        return cls.from_columns(*zip(*relations))
     
     @classmethod
     def allen_dependency_parse(cls, sentence):
         import allen_dependency_parse
         #generates an allennlp parsed dependency tree
         #further translation is required to create a DependencyTree instance
-        return DependencyTree.allen_dependency_process(
-                    allen_dependency_parse.dependency_parse(sentence)[
-                    'hierplane_tree'
-                    ]['root']
-                )
+        hierplane_tree, = parse_cache.cached_parse(
+                [sentence], 'allennlp-dependency',
+                inference.cache_archive(allen_dependency_parse.ARCHIVE, 'dependency'),
+                lambda missing: [output['hierplane_tree'] for output in
+                    allen_dependency_parse.dependency_parse_batch(missing)])
+        with instrumentation.stage('convert_dependency', sentences=1):
+            return DependencyTree.allen_dependency_process(hierplane_tree['root'])
         
     def preprocess(self, parse_dict):
         #Translates character positions of leaf nodes into word positions.
         #Allennlp does not generate word positions when parsing.
-        self.start_positions.append(parse_dict['spans'][0]['start'])
-        if 'children' in parse_dict.keys():
-            for child in parse_dict['children']:
-                self.preprocess(child)
+        stack = [parse_dict]
+        while stack:
+            node = stack.pop()
+            self.start_positions.append(node['spans'][0]['start'])
+            if 'children' in node.keys():
+                stack.extend(node['children'])
     
     @classmethod
-    def allen_dependency_process(cls, parse_dict, dependency_tree = None):
+    def allen_dependency_process(cls, parse_dict):
         #translates allennlp dependency tree into an instance of DependencyTree
         if 'children' not in parse_dict.keys(): return
-        if not dependency_tree:
-            dependency_tree = DependencyTree()
-            dependency_tree.preprocess(parse_dict)
-            dependency_tree.start_positions.sort()
-        head = parse_dict['word']
-        head_pos = parse_dict['spans'][0]['start']
-        head_pos = dependency_tree.start_positions.index(head_pos)
-        for child in parse_dict['children']:
-            relation_type = child['link']
-            tail = child['word']
-            tail_pos = child['spans'][0]['start']
-            tail_pos = dependency_tree.start_positions.index(tail_pos)
-            dependency_tree.add(head, head_pos, relation_type, tail, tail_pos)
-            cls.allen_dependency_process(child, dependency_tree)
+        dependency_tree = DependencyTree()
+        dependency_tree.preprocess(parse_dict)
+        dependency_tree.start_positions.sort()
+        #One pass over the sorted offsets maps each to its word position
+        word_positions = {}
+        for i, start in enumerate(dependency_tree.start_positions):
+            word_positions.setdefault(start, i)
+        #Relations are added in the order of a depth first walk, each one when
+        #its tail is reached from its head
+        stack = [(parse_dict, child) for child in reversed(parse_dict['children'])]
+        while stack:
+            node, child = stack.pop()
+            dependency_tree.add(node['word'], word_positions[node['spans'][0]['start']],
+                                child['link'], child['word'],
+                                word_positions[child['spans'][0]['start']])
+            if 'children' in child.keys():
+                stack.extend((child, grandchild)
+                             for grandchild in reversed(child['children']))
         return dependency_tree
 
-def get_statistics(sentence, engine='allennlp'):
+def parse_sentences(sentences, engine='allennlp', batch_size=32, max_tokens=None,
+                    dependency_engine=None):
+    #Parses sentences into lists of their constituency and dependency trees.
+    #With allennlp, both parsers run as one job that tokenizes each sentence
+    #once and runs the two models concurrently (see analysis.py). Sentences
+    #are batched by length with a budget of max_tokens padded tokens per
+    #batch (see scheduling.py), and the trees come back in input order.
+    #dependency_engine, if given, makes the dependency trees instead of
+    #engine; with 'spacy', sentences may be the parsed spaCy Spans of
+    #splitting.parsed_spans.
+    sentences = list(sentences)
+    if dependency_engine not in (None, engine):
+        texts = [str(sentence) for sentence in sentences]
+        return (ConstituencyTree.constituency_parse_batch(texts, engine, batch_size,
+                                                          max_tokens),
+                DependencyTree.dependency_parse_batch(sentences, dependency_engine))
+    if engine != 'allennlp':
+        return (ConstituencyTree.constituency_parse_batch(sentences, engine, batch_size,
+                                                          max_tokens),
+                [DependencyTree.dependency_parse(sentence, engine) for sentence in sentences])
+    import analysis
+    constituency, dependency = analysis.parse_sentences(sentences, batch_size, max_tokens)
+    with instrumentation.stage('convert_constituency', sentences=len(sentences)):
+        constituency_trees = [ConstituencyTree.allen_constituency_process(tree['root'])
+                              for tree in constituency]
+    with instrumentation.stage('convert_dependency', sentences=len(sentences)):
+        dependency_trees = [DependencyTree.allen_dependency_process(tree['root'])
+                            for tree in dependency]
+    return constituency_trees, dependency_trees
+
+def get_statistics(sentence, engine='allennlp', dependency_engine=None):
     #Gets all of the statistics printed out in the example files for a given sentence
-    ct = ConstituencyTree.constituency_parse(sentence, engine)
-    dt = DependencyTree.dependency_parse(sentence, engine)
-    return {
-            'sentence_text': sentence,
-            'num_clauses': ct.num_clauses,
-            'mean_Fdepth': ct.mean_Fdepth,
-            'total_Fdepth': ct.total_Fdepth,
-            'max_Fdepth': ct.max_Fdepth,
-            'mean_Ydepth': ct.mean_Ydepth,
-            'total_Ydepth': ct.total_Ydepth,
-            'max_Ydepth': ct.max_Ydepth,
-            'mean_SynDepLen': dt.mean_SynDepLen,
-            'total_SynDepLen': dt.total_SynDepLen,
-            'max_SynDepLen': dt.max_SynDepLen,
-            'noun_count': ct.noun_count,
-            'adj_count': ct.adj_count,
-            'adverb_count': ct.adverb_count,
-            'verb_count': ct.verb_count,
-            'det_count': ct.det_count,
-            'conj_count': ct.conj_count,
-            'prep_count': ct.prep_count,
-            'properN_count': ct.properN_count,
-    }
+    (ct,), (dt,) = parse_sentences([sentence], engine, dependency_engine=dependency_engine)
+    return tree_statistics(sentence, ct, dt)
+
+#The fields of a statistics row, in order, apart from sentenceID
+STATISTICS_FIELDS = stats_schema.STATISTICS_FIELDS
+
+def tree_statistics(sentence, ct, dt):
+    #Gets the statistics of get_statistics from trees that are already parsed
+    with instrumentation.stage('metrics'):
+        return _tree_statistics(sentence, ct, dt)
+
+def _tree_statistics(sentence, ct, dt):
+    return stats_schema.tree_row(sentence, ct, dt)
+
+def split_for_parsing(text, split_mode=None, dependency_engine=None):
+    #The sentences of text as strings, or for the spacy dependency engine as
+    #the parsed spaCy Spans whose parse it reuses
+    if dependency_engine == 'spacy':
+        return parsed_spans(text, split_mode)
+    return split_sentences(text, split_mode)
 
 class Paragraph:
-    def __init__(self, engine='allennlp', **kwargs):
+    #Passing compact=True stores the constituency trees in the array-backed
+    #form of compact_tree, which takes far less memory for large corpora.
+    #dependency_engine='spacy' takes the dependency trees from the parse
+    #the sentence splitter has already made instead of a second model.
+    def __init__(self, engine='allennlp', compact=False, split_mode=None,
+                 dependency_engine=None, **kwargs):
         assert ('text' in kwargs or ('constituency_trees' in kwargs and 'dependency_trees' in kwargs))
         self.dirname = kwargs['dirname']
+        self.engine = engine
+        self.compact = compact
+        self.dependency_engine = dependency_engine
+        with instrumentation.stage('paragraph') as stage:
+            self._parse(engine, split_mode, **kwargs)
+            stage.note(sentences=len(self.sentences))
+        if compact:
+            self.constituency_trees = [ct.compact() for ct in self.constituency_trees]
+
+    def update(self, text, split_mode=None):
+        #Re-analyses an edited version of the paragraph. The new sentences are
+        #matched with the old ones by their text, and only the sentences that
+        #are new or changed are parsed; the trees, statistics rows and
+        #diagrams of the others are reused. Returns the number of sentences
+        #that were parsed.
+        with instrumentation.stage('paragraph_update') as stage:
+            units = split_for_parsing(text, split_mode, self.dependency_engine)
+            sentences = [str(unit) for unit in units]
+            old = {}
+            for i, sentence in enumerate(self.sentences):
+                old.setdefault(sentence, []).append(i)
+            matches = [old[sentence].pop(0) if old.get(sentence) else None
+                       for sentence in sentences]
+            changed = [unit for unit, j in zip(units, matches) if j is None]
+            parsed_cts, parsed_dts = parse_sentences(
+                    changed, self.engine, dependency_engine=self.dependency_engine
+                    ) if changed else ([], [])
+            if self.compact:
+                parsed_cts = [ct.compact() for ct in parsed_cts]
+            parsed_cts, parsed_dts = iter(parsed_cts), iter(parsed_dts)
+            rows = self._statistics_per_sentence
+            digraphs = getattr(self, '_digraphs', None)
+            constituency_trees, dependency_trees = [], []
+            new_rows, new_digraphs = [], []
+            for i, (sentence, j) in enumerate(zip(sentences, matches)):
+                if j is None:
+                    ct, dt = next(parsed_cts), next(parsed_dts)
+                    with instrumentation.stage('sentence', text=sentence,
+                                               tokens=len(sentence.split())):
+                        row = {'sentenceID': i, **tree_statistics(sentence, ct, dt)}
+                    pair = None
+                else:
+                    ct, dt = self.constituency_trees[j], self.dependency_trees[j]
+                    row = {**rows[j], 'sentenceID': i}
+                    pair = digraphs[j] if digraphs is not None else None
+                constituency_trees.append(ct)
+                dependency_trees.append(dt)
+                new_rows.append(row)
+                new_digraphs.append(pair)
+            self.text = text
+            self.sentences = sentences
+            self.constituency_trees, self.dependency_trees = constituency_trees, dependency_trees
+            self._statistics_per_sentence = new_rows
+            if digraphs is not None:
+                self._digraphs = new_digraphs
+            if hasattr(self, '_statistics_table'):
+                del self._statistics_table
+            stage.note(sentences=len(sentences), parsed=len(changed))
+        instrumentation.count('sentences_reparsed', len(changed))
+        return len(changed)
+
+    def _parse(self, engine, split_mode, **kwargs):
         if 'text' in kwargs:
             self.text = kwargs['text']
-            self.sentences = [str(sentence) for sentence in 
-                sentence_splitter(kwargs['text']).sents]
-            self.constituency_trees = [
-                    ConstituencyTree.constituency_parse(sentence, engine) 
-                    for sentence in self.sentences]
-            self.dependency_trees = [
-                    DependencyTree.dependency_parse(sentence, engine) 
-                    for sentence in self.sentences]
+            units = split_for_parsing(kwargs['text'], split_mode, self.dependency_engine)
+            self.sentences = [str(unit) for unit in units]
+            self.constituency_trees, self.dependency_trees = parse_sentences(
+                    units, engine, dependency_engine=self.dependency_engine)
         elif 'constituency_trees' in kwargs:
+            #Manual annotations, either as trees or as the bracketed and typed
+            #dependency text that treebank reads
+            from treebank import parse_bracketed, parse_dependencies
             self.constituency_trees = [
-                    constituency_parse(ct) for ct in kwargs['constituency_trees']
+                    parse_bracketed(ct) if isinstance(ct, str) else ct
+                    for ct in kwargs['constituency_trees']
                 ]
             self.dependency_trees = [
-                    dependency_parse(dt) for dt in kwargs['dependency_trees']
+                    parse_dependencies(dt) if isinstance(dt, str) else dt
+                    for dt in kwargs['dependency_trees']
                 ]
             self.sentences = [ct.words for ct in self.constituency_trees]
+        ConstituencyTree.tally_parts_of_speech_batch(self.constituency_trees)
+        rows = []
+        for i, sentence, ct, dt in zip(range(len(self.sentences)), self.sentences,
+                                       self.constituency_trees, self.dependency_trees):
+            #Timed like the rows of sentence_chunk_statistics, so that the
+            #collector's sentence report covers Paragraph runs too
+            with instrumentation.stage('sentence', text=sentence,
+                                       tokens=len(sentence.split())):
+                rows.append({'sentenceID': i, **tree_statistics(sentence, ct, dt)})
+        self._statistics_per_sentence = rows
     
     @property
     def statistics_per_sentence(self):
-        if not hasattr(self, '_statistics_per_sentence'):
-            self._statistics_per_sentence = [
-                {
-                'sentenceID': i,
-                'sentence_text': sentence,
-                'num_clauses': ct.num_clauses,
-                'mean_Fdepth': ct.mean_Fdepth,
-                'total_Fdepth': ct.total_Fdepth,
-                'max_Fdepth': ct.max_Fdepth,
-                'mean_Ydepth': ct.mean_Ydepth,
-                'total_Ydepth': ct.total_Ydepth,
-                'max_Ydepth': ct.max_Ydepth,
-                'mean_SynDepLen': dt.mean_SynDepLen,
-                'total_SynDepLen': dt.total_SynDepLen,
-                'max_SynDepLen': dt.max_SynDepLen,
-                'noun_count': ct.noun_count,
-                'adj_count': ct.adj_count,
-                'adverb_count': ct.adverb_count,
-                'verb_count': ct.verb_count,
-                'det_count': ct.det_count,
-                'conj_count': ct.conj_count,
-                'prep_count': ct.prep_count,
-                'properN_count': ct.properN_count,
-                } for i, sentence, ct, dt in zip(
-                        range(len(self.sentences)),
-                        self.sentences, self.constituency_trees, 
-                        self.dependency_trees)
-            ]
         return self._statistics_per_sentence
+
+    @property
+    def statistics_table(self):
+        #statistics_per_sentence as a typed table, built column by column
+        #from the trees
+        if not hasattr(self, '_statistics_table'):
+            import stats_table
+            self._statistics_table = stats_table.from_trees(
+                    self.sentences, self.constituency_trees, self.dependency_trees)
+        return self._statistics_table
     
     def __repr__(self):
-            return f"""sentenceID|sentence_text|num_clauses|mean_Fdepth|total_Fdepth|mean_Ydepth|total_Ydepth|mean_SynDepLen|total_SynDepLen|noun_count|adj_count|adverb_count|verb_count|det_count|conj_count|prep_count|properN_count
-        {"".join([f'''{s["sentenceID"]}|{s["sentence_text"]}|{s["num_clauses"]}|{s["mean_Fdepth"]}|{s["total_Fdepth"]}|{s["mean_Ydepth"]}|{s["total_Ydepth"]}|{s["mean_SynDepLen"]}|{s["total_SynDepLen"]}|{s["noun_count"]}|{s["adj_count"]}|{s["adverb_count"]}|{s["verb_count"]}|{s["det_count"]}|{s["conj_count"]}|{s["prep_count"]}|{s["properN_count"]}
-        '''
-        for s in self.statistics_per_sentence])}"""
-    def graph(self):
-        paths = []
-        for ct, dt, i in zip(self.constituency_trees, self.dependency_trees, range(len(self.constituency_trees))):
-            ctpath = self.dirname + '/' + str(i) + '_ct.gz'
-            dtpath = self.dirname + '/' + str(i) + '_dt.gz'
-            paths.append(ctpath + '.pdf')
-            paths.append(dtpath + '.pdf')
-            ct.frazier_yngve_graph(view=False, path=ctpath)
-            dt.graph(view=False, path=dtpath)
+        return pipe_table(self.statistics_per_sentence)
+
+    def graph(self, workers=4, reuse=True, cache_dir=None):
+        #Renders the constituency and dependency diagrams of every sentence into
+        #dirname/sentence_diagrams.pdf. Diagrams are rendered to bytes by up to
+        #workers dot processes at once and merged in memory. With reuse, a
+        #diagram whose graphviz source has not changed since it was last
+        #rendered is not rendered again; cache_dir also keeps rendered
+        #diagrams on disk between runs.
+        from concurrent.futures import ThreadPoolExecutor
+        from PyPDF2 import PdfFileMerger
+        if not hasattr(self, '_rendered') or not reuse:
+            self._rendered = {}
+        #The digraphs of sentences kept by update are None until built here
+        if not hasattr(self, '_digraphs') or not reuse:
+            self._digraphs = [None] * len(self.sentences)
+        digraphs = []
+        for i, (ct, dt) in enumerate(zip(self.constituency_trees, self.dependency_trees)):
+            if self._digraphs[i] is None:
+                self._digraphs[i] = (ct.frazier_yngve_digraph(), dt.digraph())
+            digraphs.extend(self._digraphs[i])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pdfs = list(pool.map(lambda job: self._render(*job, cache_dir),
+                                 enumerate(digraphs)))
+        self._rendered = {key: pdf for key, pdf in pdfs}
         merger = PdfFileMerger()
-        for file in paths:
-            merger.append(file)
+        for _, pdf in pdfs:
+            merger.append(io.BytesIO(pdf))
         merger.write(self.dirname + '/' + 'sentence_diagrams.pdf')
-        for file in paths:
-            os.remove(file)
-            os.remove(file[:-4])
+        merger.close()
 
-def process_sentences(text):
+    def _render(self, i, dot, cache_dir=None):
+        #Returns the hash of a diagram's source and its PDF bytes
+        key = hashlib.sha1(dot.source.encode('utf-8')).hexdigest()
+        if key in self._rendered:
+            return key, self._rendered[key]
+        cached = cache_dir and os.path.join(cache_dir, key + '.pdf')
+        if cached and os.path.exists(cached):
+            with open(cached, 'rb') as f:
+                return key, f.read()
+        with instrumentation.stage('render', sentenceID=i // 2):
+            pdf = dot.pipe(format='pdf')
+        if cached:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cached, 'wb') as f:
+                f.write(pdf)
+        return key, pdf
+
+def process_sentences(text, engine='allennlp', split_mode=None, dependency_engine=None):
     #Breaks up a text into sentences and gets statistics and returns a printable representation
     #of the collected statistics.
-    sentences = sentence_splitter(text).sents
-    dicts = [{**get_statistics(str(sentence)), **{'sentenceID': i}}
-        for i, sentence in enumerate(sentences)
-    ]
-    return f"""sentenceID|sentence_text|num_clauses|mean_Fdepth|total_Fdepth|mean_Ydepth|total_Ydepth|mean_SynDepLen|total_SynDepLen|noun_count|adj_count|adverb_count|verb_count|det_count|conj_count|prep_count|properN_count
-    {"".join([f'''{s["sentenceID"]}|{s["sentence_text"]}|{s["num_clauses"]}|{s["mean_Fdepth"]}|{s["total_Fdepth"]}|{s["mean_Ydepth"]}|{s["total_Ydepth"]}|{s["mean_SynDepLen"]}|{s["total_SynDepLen"]}|{s["noun_count"]}|{s["adj_count"]}|{s["adverb_count"]}|{s["verb_count"]}|{s["det_count"]}|{s["conj_count"]}|{s["prep_count"]}|{s["properN_count"]}
-    '''
-    for s in dicts])}"""
-
-def get_paragraph_statistics(text):
-    sentences = sentence_splitter(text).sents
-    return [{**get_statistics(str(sentence)), **{'sentenceID': i}}
-        for i, sentence in enumerate(sentences)
-    ]
+    return pipe_table(iter_paragraph_statistics(text, engine, split_mode=split_mode,
+                                                dependency_engine=dependency_engine))
+
+def iter_paragraph_statistics(text, engine='allennlp', batch_size=16, split_mode=None,
+                              dependency_engine=None, window=None):
+    #Yields the statistics of each sentence of text as soon as the window
+    #of sentences it belongs to has been parsed, so output can be written
+    #while the rest of a long text is still being parsed. Each window, by
+    #default scheduling.DEFAULT_WINDOW sentences, is batched by length as a
+    #whole, with at most batch_size sentences per batch.
+    import scheduling
+    window = max(window or scheduling.DEFAULT_WINDOW, batch_size)
+    sentences = iter(split_for_parsing(text, split_mode, dependency_engine))
+    start = 0
+    while True:
+        chunk = list(islice(sentences, window))
+        if not chunk:
+            return
+        yield from sentence_chunk_statistics(chunk, engine, start, dependency_engine,
+                                             batch_size)
+        start += len(chunk)
+
+def get_paragraph_statistics(text, engine='allennlp', workers=1, chunk_size=16,
+                             split_mode=None, dependency_engine=None):
+    if workers > 1:
+        #Spans do not cross process boundaries, so with the spacy dependency
+        #engine the workers parse their sentences with spaCy again
+        import corpus
+        sentences = split_sentences(text, split_mode)
+        return corpus.sentence_statistics(sentences, engine, workers, chunk_size,
+                                          dependency_engine=dependency_engine)
+    #The whole paragraph is batched by length at once
+    return sentence_chunk_statistics(split_for_parsing(text, split_mode, dependency_engine),
+                                     engine, 0, dependency_engine, chunk_size)
+
+def sentence_chunk_statistics(sentences, engine='allennlp', start=0, dependency_engine=None,
+                              batch_size=32, max_tokens=None):
+    #Gets the statistics of a run of already split sentences, numbering them
+    #from start so that chunks of one paragraph can be parsed separately
+    constituency_trees, dependency_trees = parse_sentences(
+            sentences, engine, batch_size, max_tokens, dependency_engine=dependency_engine)
+    sentences = [str(sentence) for sentence in sentences]
+    ConstituencyTree.tally_parts_of_speech_batch(constituency_trees)
+    rows = []
+    for i, sentence, ct, dt in zip(range(start, start + len(sentences)), sentences,
+                                   constituency_trees, dependency_trees):
+        #The sentence stage covers the work done for each sentence alone; the
+        #batched parses are timed as constituency_predict and dependency_predict
+        with instrumentation.stage('sentence', text=sentence,
+                                   tokens=len(sentence.split())):
+            rows.append({**tree_statistics(sentence, ct, dt), **{'sentenceID': i}})
+    instrumentation.count('sentences_parsed', len(rows))
+    return rows
 
 def parse_manual_annotated(text, dirname):
+    from treebank import iter_treebank
     start_text_position = re.search(r'Here:', text).span()[1]
     try:
         str_position = re.search(r'Str:', text).span()[0]
     except AttributeError:
         str_position = len(text) - 1
-    root_positions = [r.span()[1] for r in re.finditer(r'\(ROOT', text)]
-    def find_closing_parenthesis(subtext):
-        par_count = 0
-        for i, c in enumerate(subtext):
-            if c == '(':
-                par_count += 1
-            elif c == ')': 
-                par_count -= 1
-            if par_count < 0:
-                return i
-    root_end_positions = [rp + find_closing_parenthesis(text[rp:])
-        for rp in root_positions
-    ]
-    auto_paragraph = Paragraph(text=text[start_text_position: root_positions[0] - 6], dirname=dirname + '_auto')
-    constituency_trees = [
-            text[rp:rep] for rp, rep in zip(root_positions, root_end_positions)
-            ]
-    dependency_trees = [
-            text[rep + 2: n - 6] for rep, n in zip(root_end_positions, root_positions[1:] + [str_position + 6])
-            ]
+    #The passage ends just before the first tree, and the trees and their
+    #dependencies run from there until Str:
+    first_root = text.index('(ROOT')
+    auto_paragraph = Paragraph(text=text[start_text_position: first_root - 1], dirname=dirname + '_auto')
+    constituency_trees, dependency_trees = [], []
+    for ct, dt in iter_treebank(io.StringIO(text[first_root:str_position])):
+        constituency_trees.append(ct)
+        dependency_trees.append(dt)
     manual_paragraph = Paragraph(constituency_trees=constituency_trees, 
                                              dependency_trees=dependency_trees, dirname=dirname + '_manual')
     return auto_paragraph, manual_paragraph
 
-def process_multiple_manual(paths, dirnames):
-    stat_list = []
-    for path, dirname in zip(paths, dirnames):
-        if not os.path.exists(dirname + '_auto'):
-            os.makedirs(dirname + '_auto')
-        if not os.path.exists(dirname + '_manual'):
-            os.makedirs(dirname + '_manual')
-        with open(path) as f: text = f.read()
-        auto_paragraph, manual_paragraph = parse_manual_annotated(text, dirname)
-        auto_paragraph.graph()
-        manual_paragraph.graph()
-        auto_stats = auto_paragraph.statistics_per_sentence
-        manual_stats = manual_paragraph.statistics_per_sentence
-        for i, (a, m) in enumerate(zip(auto_stats, manual_stats)):
-            stat_list.append({
-                'index': dirname + str(i),
-                'Max Y': m['max_Ydepth'],
-                'Auto Max Y': a['max_Ydepth'],
-                'Total Y': m['total_Ydepth'],
-                'Max F': m['max_Fdepth'],
-                'Auto Max F': a['max_Fdepth'],
-                'Total F': m['total_Fdepth'],
-                'Auto Total F': a['total_Fdepth'],
-                'Total Dep': m['total_SynDepLen'],
-                'Auto Total Dep': a['total_SynDepLen'],
-                'Max Dep': m['max_SynDepLen'],
-                'Auto Max Dep': a['max_SynDepLen'],
-                    })
-    df = pd.DataFrame(stat_list)
-    df.to_csv('complexity_Jacob.csv')
+def compare_paragraphs(auto_paragraph, manual_paragraph, dirname):
+    #Pairs up the sentences of the automatic and manual parses of a passage
+    #in a table with one row per aligned sentence or unaligned group of
+    #sentences (see agreement.py)
+    import agreement
+    return agreement.comparison_table(
+            agreement.sentence_pairs(auto_paragraph, manual_paragraph, dirname))
+
+def process_manual_file(path, dirname):
+    #Parses, graphs and aligns a single manually annotated file, returning
+    #the sentence pairs of agreement.sentence_pairs
+    with instrumentation.stage('file', path=path):
+        return _process_manual_file(path, dirname)
+
+def _process_manual_file(path, dirname):
+    if not os.path.exists(dirname + '_auto'):
+        os.makedirs(dirname + '_auto')
+    if not os.path.exists(dirname + '_manual'):
+        os.makedirs(dirname + '_manual')
+    with open(path) as f: text = f.read()
+    auto_paragraph, manual_paragraph = parse_manual_annotated(text, dirname)
+    auto_paragraph.graph()
+    manual_paragraph.graph()
+    import agreement
+    return agreement.sentence_pairs(auto_paragraph, manual_paragraph, dirname)
+
+def process_multiple_manual(paths, dirnames, workers=1, output='complexity_Jacob.csv',
+                            checkpoint_dir=None, retry_failed=False, report=None):
+    #The comparison rows of each file, including rows marked by their kind
+    #column for sentences that could not be aligned one to one, are written
+    #to output as each file is finished rather than all at the end. Returns the sentence
+    #pairs of all files as one table, with a file column holding the dirname
+    #of each row's file for grouping. With report, the agreement report of
+    #agreement.report, overall and per file, is written there as JSON.
+    #With checkpoint_dir, each file's results are saved there as it finishes
+    #and a restarted run picks up where the last one stopped, and a file
+    #that fails is quarantined instead of stopping the run (see
+    #checkpoint.py).
+    if checkpoint_dir is not None:
+        frame = _process_multiple_manual_checkpointed(
+                paths, dirnames, workers, output, checkpoint_dir, retry_failed)
+        _write_agreement_report(frame, report)
+        return frame
+    if workers > 1:
+        import corpus
+        tables = corpus.manual_statistics(paths, dirnames, workers)
+    else:
+        tables = (process_manual_file(path, dirname)
+                  for path, dirname in zip(paths, dirnames))
+    import agreement
+    import stats_table
+    finished = []
+    with CSVSink(output, index=True) as sink:
+        for table in tables:
+            sink.write_all(stats_table.records(agreement.comparison_table(table)))
+            finished.append(table)
+    frame = stats_table.concat(finished, keys=dirnames, name='file')
+    _write_agreement_report(frame, report)
+    return frame
+
+def _write_agreement_report(frame, report):
+    if report is None:
+        return
+    import json
+    import agreement
+    with open(report, 'w') as f:
+        json.dump(agreement.report(frame, by='file'), f, indent=1)
+
+def _process_multiple_manual_checkpointed(paths, dirnames, workers, output,
+                                          checkpoint_dir, retry_failed):
+    import warnings
+    import agreement
+    import checkpoint
+    import corpus
+    import stats_table
+    paths, dirnames = list(paths), list(dirnames)
+    manifest = checkpoint.Manifest(checkpoint_dir)
+    digests = [checkpoint.file_digest(path) for path in paths]
+    statuses = [manifest.status(path, dirname, digest)
+                for path, dirname, digest in zip(paths, dirnames, digests)]
+    pending = [i for i, status in enumerate(statuses)
+               if status is None or (status == 'failed' and retry_failed)]
+    #Tables are kept by input position and written to output in input order
+    #as soon as every file before them is done
+    tables = {i: manifest.load(paths[i], dirnames[i])
+              for i, status in enumerate(statuses) if status == 'done'}
+    failed = {i for i, status in enumerate(statuses)
+              if status == 'failed' and not retry_failed}
+    instrumentation.count('files_skipped', len(tables) + len(failed))
+    next_to_write = 0
+    with CSVSink(output, index=True) as sink:
+        def write_ready():
+            nonlocal next_to_write
+            while next_to_write < len(paths) and (
+                    next_to_write in tables or next_to_write in failed):
+                if next_to_write in tables:
+                    sink.write_all(stats_table.records(
+                            agreement.comparison_table(tables[next_to_write])))
+                next_to_write += 1
+
+        write_ready()
+        results = corpus.checked_manual_statistics(
+                [paths[i] for i in pending], [dirnames[i] for i in pending], workers)
+        for j, table, error in results:
+            i = pending[j]
+            if error is None:
+                manifest.record_done(paths[i], dirnames[i], digests[i], table)
+                tables[i] = table
+            else:
+                quarantined = manifest.record_failed(paths[i], dirnames[i], digests[i], error)
+                failed.add(i)
+                instrumentation.count('files_failed')
+                warnings.warn(f'{paths[i]} failed and was quarantined, see {quarantined}')
+            write_ready()
+    order = sorted(tables)
+    return stats_table.concat([tables[i] for i in order],
+                              keys=[dirnames[i] for i in order], name='file')
     
 #paths, dirnames = ["/Users/jacobsolinsky/Downloads/Validation_GK_S1.txt", "/Users/jacobsolinsky/Downloads/Validation_JD_S1.txt", "/Users/jacobsolinsky/Downloads/Validation_SS_S1.txt"], ['GK', 'JD', 'SS']
             
\ No newline at end of file
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU inference settings for the AllenNLP constituency and dependency models.
+
+Every predictor the models registry loads goes through prepare, which puts
+the model in eval mode and, when quantization is on, replaces its Linear and
+LSTM layers with dynamically quantized int8 versions. The parsing functions
+run the models inside no_grad, so no autograd state is built during
+inference, and set_threads fixes how many threads torch uses for each
+operation, which matters when several worker processes share one machine.
+
+The settings come from configure or from the environment:
+    CLAS_TORCH_THREADS          intra-op threads per process
+    CLAS_TORCH_INTEROP_THREADS  inter-op threads per process
+    CLAS_QUANTIZE               set to 1 to quantize the models to int8
+Quantization only applies to models loaded after it is turned on, so
+models.unload the parsers to reload them with a new setting.
+
+Quantized models do not give exactly the same parses as the full precision
+ones. benchmarks/compare_inference.py measures the speedup and the drift of
+the statistics on a fixture set. Parses from quantized models are cached
+under their own key, so they never mix with full precision parses in the
+parse cache. The key follows how the loaded model was prepared, not the
+current setting, so changing the setting without reloading the models does
+not file their parses under the wrong key.
+"""
+import contextlib
+import os
+
+_settings = {
+        'threads': int(os.environ['CLAS_TORCH_THREADS'])
+        if os.environ.get('CLAS_TORCH_THREADS') else None,
+        'interop_threads': int(os.environ['CLAS_TORCH_INTEROP_THREADS'])
+        if os.environ.get('CLAS_TORCH_INTEROP_THREADS') else None,
+        'quantize': os.environ.get('CLAS_QUANTIZE', '') not in ('', '0'),
+}
+
+
+def configure(threads=None, interop_threads=None, quantize=None):
+    #Changes the settings that are given and applies the thread counts
+    if threads is not None:
+        _settings['threads'] = threads
+    if interop_threads is not None:
+        _settings['interop_threads'] = interop_threads
+    if quantize is not None:
+        _settings['quantize'] = quantize
+    set_threads()
+
+
+def settings():
+    return dict(_settings)
+
+
+def set_threads():
+    try:
+        import torch
+    except ImportError:
+        return
+    if _settings['threads']:
+        torch.set_num_threads(_settings['threads'])
+    if _settings['interop_threads']:
+        try:
+            torch.set_num_interop_threads(_settings['interop_threads'])
+        except RuntimeError:
+            #torch only allows this before any inter-op work has started
+            pass
+
+
+def prepare(predictor):
+    #Readies a freshly loaded predictor for CPU inference
+    model = getattr(predictor, '_model', None)
+    if model is None:
+        return predictor
+    import torch
+    set_threads()
+    model.eval()
+    if _settings['quantize']:
+        predictor._model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8)
+    predictor._quantized = _settings['quantize']
+    return predictor
+
+
+@contextlib.contextmanager
+def no_grad():
+    #torch.no_grad, or nothing when torch is not installed. Like
+    #torch.no_grad it only covers the current thread.
+    try:
+        import torch
+    except ImportError:
+        yield
+        return
+    with torch.no_grad():
+        yield
+
+
+def is_quantized(name):
+    #Whether the model registered as name was quantized when it was loaded,
+    #or, if it is not loaded yet, whether it will be
+    import models
+    if models.is_loaded(name):
+        return getattr(models.get(name), '_quantized', False)
+    return _settings['quantize']
+
+
+def cache_archive(archive, name):
+    #The archive name the parses of the model registered as name are cached
+    #under
+    return archive + '#int8' if is_quantized(name) else archive
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-stage timing and counters for depth.py.
+
+The pipeline marks its stages with the stage context manager and its events
+with count. While no Collector is active and no hook is registered these do
+nothing but check two lists, so instrumentation costs next to nothing when it
+is off.
+
+>>> with Collector() as collector:
+...     get_paragraph_statistics(text)
+>>> print(collector.report())
+
+Stages recorded by the pipeline:
+    split                  sentence splitting
+    tokenize               shared tokenization of the fused parse job
+    constituency_predict   constituency parser calls
+    dependency_predict     dependency parser calls
+    convert_constituency   hierplane to ConstituencyTree conversion
+    convert_dependency     hierplane to DependencyTree conversion
+    metrics                statistics of parsed trees
+    sentence               the statistics of one sentence
+    render                 Graphviz rendering in Paragraph.graph
+    paragraph, file        a whole Paragraph, a whole manually annotated file
+Counters: cache_hits, cache_misses, sentences_parsed.
+
+Stages that run in the worker processes of corpus.py are collected in the
+worker and merged into the parent's active Collectors as each job returns.
+"""
+import threading
+import time
+from collections import defaultdict
+
+_collectors = []
+_hooks = []
+_lock = threading.Lock()
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def note(self, **info):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        for collector in list(_collectors):
+            collector.record(self.name, elapsed, self.info)
+        for hook in list(_hooks):
+            hook(self.name, elapsed, self.info)
+        return False
+
+    def note(self, **info):
+        #Adds details that are only known once the stage has started
+        self.info.update(info)
+
+
+def stage(name, **info):
+    #Times the enclosed block as one call of stage name
+    if not _collectors and not _hooks:
+        return _NULL_STAGE
+    return _Stage(name, info)
+
+
+def count(name, n=1):
+    if not _collectors:
+        return
+    for collector in list(_collectors):
+        collector.count(name, n)
+
+
+def enabled():
+    return bool(_collectors or _hooks)
+
+
+def collecting():
+    #Whether any Collector is active, which is what worker processes need
+    #to know to send their records back
+    return bool(_collectors)
+
+
+def merge(records):
+    #Adds the exported records of a Collector in another process, such as a
+    #corpus worker, to every active Collector. Hooks only see the stages of
+    #their own process.
+    if not records:
+        return
+    for collector in list(_collectors):
+        collector.merge(records)
+
+
+def add_hook(hook):
+    #hook(stage_name, seconds, info) is called at the end of every stage
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+class Collector:
+    #Accumulates stage timings and counters while it is active
+    def __init__(self):
+        self.stages = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'max': 0.0})
+        self.counters = defaultdict(int)
+        self.sentences = []
+        self.started = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        with _lock:
+            _collectors.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _lock:
+            _collectors.remove(self)
+        self.elapsed = time.perf_counter() - self.started
+        return False
+
+    def record(self, name, seconds, info):
+        with _lock:
+            totals = self.stages[name]
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            totals['max'] = max(totals['max'], seconds)
+            if name == 'sentence':
+                self.sentences.append({'seconds': seconds, **info})
+
+    def count(self, name, n=1):
+        with _lock:
+            self.counters[name] += n
+
+    def export(self):
+        #The records as plain data that can be pickled back to the parent
+        with _lock:
+            return {'stages': {name: dict(totals) for name, totals in self.stages.items()},
+                    'counters': dict(self.counters),
+                    'sentences': list(self.sentences)}
+
+    def merge(self, records):
+        with _lock:
+            for name, other in records['stages'].items():
+                totals = self.stages[name]
+                totals['calls'] += other['calls']
+                totals['seconds'] += other['seconds']
+                totals['max'] = max(totals['max'], other['max'])
+            for name, n in records['counters'].items():
+                self.counters[name] += n
+            self.sentences.extend(records['sentences'])
+
+    def summary(self, slowest=10):
+        sentences = sorted(self.sentences, key=lambda s: s['seconds'], reverse=True)
+        lengths = [s.get('tokens', 0) for s in self.sentences]
+        return {
+                'elapsed': self.elapsed,
+                'stages': {name: dict(totals, mean=totals['seconds'] / totals['calls'])
+                           for name, totals in self.stages.items()},
+                'counters': dict(self.counters),
+                'sentence_count': len(self.sentences),
+                'mean_sentence_tokens': sum(lengths) / len(lengths) if lengths else 0,
+                'max_sentence_tokens': max(lengths, default=0),
+                'slowest_sentences': sentences[:slowest],
+        }
+
+    def report(self, slowest=10):
+        #A printable summary of the run
+        summary = self.summary(slowest)
+        lines = [f"{'stage':<24}{'calls':>8}{'seconds':>12}{'mean':>12}{'max':>12}"]
+        for name, totals in sorted(summary['stages'].items(),
+                                   key=lambda item: item[1]['seconds'], reverse=True):
+            lines.append(f"{name:<24}{totals['calls']:>8}{totals['seconds']:>12.4f}"
+                         f"{totals['mean']:>12.4f}{totals['max']:>12.4f}")
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f'{name}: {value}')
+        lines.append(f"sentences: {summary['sentence_count']}, "
+                     f"mean tokens {summary['mean_sentence_tokens']:.1f}, "
+                     f"max tokens {summary['max_sentence_tokens']}")
+        if summary['slowest_sentences']:
+            lines.append('slowest sentences:')
+            for sentence in summary['slowest_sentences']:
+                lines.append(f"{sentence['seconds']:>10.4f}  {sentence.get('tokens', '?'):>4}  "
+                             f"{sentence.get('text', '')[:80]}")
+        return '\n'.join(lines)
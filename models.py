@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registry of the models used by depth.py: the spaCy sentence splitter and the
+AllenNLP constituency and dependency predictors.
+
+Nothing is loaded when this module, or depth.py, is imported. Each model is
+loaded the first time it is asked for with get, and kept for the rest of the
+process. preload loads them up front, for example when a worker process
+starts. set replaces a model, which lets tests and benchmarks run with stub
+predictors.
+
+Archives are resolved in this order:
+    1. CLAS_CONSTITUENCY_ARCHIVE / CLAS_DEPENDENCY_ARCHIVE, a path or URL
+    2. a file with the archive's name in the directory CLAS_MODEL_DIR
+    3. the download URL, cached by allennlp in CLAS_MODEL_CACHE if it is set
+The spaCy model is CLAS_SPACY_MODEL, a package name or path, by default
+en_core_web_sm. The parsers are readied for CPU inference by inference.prepare
+as they are loaded.
+"""
+import os
+import threading
+
+CONSTITUENCY_ARCHIVE = "https://s3-us-west-2.amazonaws.com/allennlp/models/elmo-constituency-parser-2018.03.14.tar.gz"
+DEPENDENCY_ARCHIVE = "https://s3-us-west-2.amazonaws.com/allennlp/models/biaffine-dependency-parser-ptb-2018.08.23.tar.gz"
+SPACY_MODEL = 'en_core_web_sm'
+
+_models = {}
+_loaders = {}
+_lock = threading.RLock()
+
+
+def register(name, loader):
+    #loader is called with no arguments the first time name is needed
+    _loaders[name] = loader
+
+
+def get(name):
+    if name not in _models:
+        with _lock:
+            if name not in _models:
+                _models[name] = _loaders[name]()
+    return _models[name]
+
+
+def set(name, model):
+    _models[name] = model
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def unload(name=None):
+    #Forgets one model, or all of them, so it is loaded again on next use
+    if name is None:
+        _models.clear()
+    else:
+        _models.pop(name, None)
+
+
+def preload(*names):
+    #Loads the named models, or every registered model, ahead of first use
+    for name in names or list(_loaders):
+        get(name)
+
+
+def resolve_archive(url, override_variable):
+    if os.environ.get(override_variable):
+        return os.environ[override_variable]
+    model_dir = os.environ.get('CLAS_MODEL_DIR')
+    if model_dir:
+        local = os.path.join(model_dir, os.path.basename(url))
+        if os.path.exists(local):
+            return local
+    cache_dir = os.environ.get('CLAS_MODEL_CACHE')
+    if cache_dir:
+        from allennlp.common.file_utils import cached_path
+        return cached_path(url, cache_dir=cache_dir)
+    return url
+
+
+def _load_sentence_splitter():
+    import spacy
+    return spacy.load(os.environ.get('CLAS_SPACY_MODEL', SPACY_MODEL))
+
+
+def _load_constituency():
+    from allennlp.models.archival import load_archive
+    from allennlp.predictors.predictor import Predictor
+    import inference
+    archive = load_archive(resolve_archive(CONSTITUENCY_ARCHIVE,
+                                           'CLAS_CONSTITUENCY_ARCHIVE'))
+    return inference.prepare(Predictor.from_archive(archive, 'constituency-parser'))
+
+
+def _load_dependency():
+    import inference
+    from allennlp.predictors.predictor import Predictor
+    return inference.prepare(Predictor.from_path(
+            resolve_archive(DEPENDENCY_ARCHIVE, 'CLAS_DEPENDENCY_ARCHIVE')))
+
+
+register('sentence_splitter', _load_sentence_splitter)
+register('constituency', _load_constituency)
+register('dependency', _load_dependency)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of parser output, so that sentences which have been parsed
+before do not go through the neural models again.
+
+Entries are the raw hierplane_tree dicts that allen_constituency_process and
+allen_dependency_process consume, keyed by a hash of the normalized sentence
+text, the engine and the model archive. The cache is an SQLite file, which
+makes it safe to share between several worker processes, and it keeps at most
+max_entries trees, evicting the least recently used ones first.
+
+The cache is off until it is configured, either by calling configure or by
+setting the CLAS_PARSE_CACHE environment variable to the path of the cache
+file.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+import instrumentation
+
+DEFAULT_MAX_ENTRIES = 100000
+
+
+def normalize(sentence):
+    #Sentences that differ only in unicode form or whitespace parse identically
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', sentence)).strip()
+
+
+def cache_key(sentence, engine, archive):
+    return hashlib.sha1(
+            '\0'.join([normalize(sentence), engine, archive]).encode('utf-8')
+            ).hexdigest()
+
+
+class ParseCache:
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self._pid = None
+        self._connection = None
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS parses (
+                    key TEXT PRIMARY KEY,
+                    tree TEXT NOT NULL,
+                    last_used REAL NOT NULL)''')
+            self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)')
+
+    def __repr__(self):
+        return f'ParseCache({self.path!r}, hits={self.hits}, misses={self.misses})'
+
+    @property
+    def connection(self):
+        #SQLite connections must not cross a fork, so every process opens its own
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._pid = os.getpid()
+        return self._connection
+
+    def get_many(self, keys):
+        #Returns a dict of the keys that are cached and their trees, marking
+        #them as recently used
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.connection.execute(
+                    'SELECT key, tree FROM parses WHERE key IN (%s)'
+                    % ','.join('?' * len(chunk)), chunk).fetchall()
+            found.update((key, json.loads(tree)) for key, tree in rows)
+        if found:
+            now = time.time()
+            with self.connection:
+                self.connection.executemany(
+                        'UPDATE parses SET last_used = ? WHERE key = ?',
+                        [(now, key) for key in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        #Stores (key, tree) pairs, then evicts the least recently used trees
+        #beyond max_entries
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                    'INSERT OR REPLACE INTO parses (key, tree, last_used) VALUES (?, ?, ?)',
+                    [(key, json.dumps(tree), now) for key, tree in items])
+            self.connection.execute(
+                    '''DELETE FROM parses WHERE key IN (
+                        SELECT key FROM parses ORDER BY last_used DESC
+                        LIMIT -1 OFFSET ?)''', (self.max_entries,))
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM parses').fetchone()[0]
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute('DELETE FROM parses')
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self),
+        }
+
+
+_cache = None
+if os.environ.get('CLAS_PARSE_CACHE'):
+    _cache = ParseCache(os.environ['CLAS_PARSE_CACHE'])
+
+
+def configure(path=None, max_entries=DEFAULT_MAX_ENTRIES):
+    #Turns the cache on at path, or off if path is None
+    global _cache
+    _cache = ParseCache(path, max_entries) if path else None
+    return _cache
+
+
+def get_cache():
+    return _cache
+
+
+def cached_parse(sentences, engine, archive, parse):
+    #Returns the hierplane trees of sentences, calling parse with the list of
+    #sentences that are not cached yet. parse must return their trees in order.
+    sentences = list(sentences)
+    if _cache is None:
+        return parse(sentences)
+    keys = [cache_key(sentence, engine, archive) for sentence in sentences]
+    found = _cache.get_many(list(set(keys)))
+    instrumentation.count('cache_hits', len(found))
+    instrumentation.count('cache_misses', len(set(keys)) - len(found))
+    missing = {}
+    for sentence, key in zip(sentences, keys):
+        if key not in found and key not in missing:
+            missing[key] = sentence
+    if missing:
+        trees = parse(list(missing.values()))
+        new = dict(zip(missing.keys(), trees))
+        _cache.put_many(new.items())
+        found.update(new)
+    return [found[key] for key in keys]
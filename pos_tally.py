@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Part of speech counts from a precompiled tag-to-category table.
+
+A PosTable maps category names to rules: a tag prefix, a list of prefixes
+or a function of the tag. A tag counts towards every category whose rule it
+matches, so with the default categories NNP is both a noun and a proper
+noun. Each tag is matched against the rules once, the first time the table
+sees it, and gets an integer id and a row of the table's membership matrix.
+
+count_trees gives the counts of many trees at once: the tag ids of all their
+leaves go through one bincount, which gives every tree's count of every tag,
+and one product with the membership matrix turns those into category counts.
+
+>>> table = PosTable({'wh_count': 'W', 'modal_count': 'MD', 'verb_count': 'V'})
+>>> counts = count_trees(trees, table)    #one row per tree, one column per name
+"""
+import numpy as np
+
+#The categories of the statistics rows, in the order ConstituencyTree has
+#always tallied them
+DEFAULT_CATEGORIES = {
+        'noun_count': 'N',
+        'adj_count': 'JJ',
+        'adverb_count': 'RB',
+        'verb_count': 'V',
+        'det_count': 'DT',
+        'personal_pronoun_count': 'PRP',
+        'conj_count': 'CC',
+        'prep_count': 'IN',
+        'properN_count': 'NNP',
+}
+
+
+class PosTable:
+    def __init__(self, categories=None):
+        self.categories = dict(DEFAULT_CATEGORIES if categories is None else categories)
+        self.names = list(self.categories)
+        self.tag_ids = {}
+        self._rows = []
+        self._membership = None
+        self._node_type_ids = np.zeros(0, dtype=np.int64)
+
+    def matches(self, tag, rule):
+        if callable(rule):
+            return bool(rule(tag))
+        if isinstance(rule, str):
+            return tag.startswith(rule)
+        return any(tag.startswith(prefix) for prefix in rule)
+
+    def tag_id(self, tag):
+        if tag not in self.tag_ids:
+            self.tag_ids[tag] = len(self._rows)
+            self._rows.append([int(self.matches(tag, self.categories[name]))
+                               for name in self.names])
+            self._membership = None
+        return self.tag_ids[tag]
+
+    def ids(self, tags):
+        return np.array([self.tag_id(tag) for tag in tags], dtype=np.int64)
+
+    @property
+    def membership(self):
+        #Row i says which categories tag id i counts towards
+        if self._membership is None:
+            self._membership = np.array(self._rows, dtype=np.int64).reshape(
+                    len(self._rows), len(self.names))
+        return self._membership
+
+    def node_type_ids(self):
+        #The tag id of each interned node type of compact_tree, by node type id
+        from compact_tree import NODE_TYPES
+        known = len(self._node_type_ids)
+        if known < len(NODE_TYPES):
+            self._node_type_ids = np.concatenate(
+                    (self._node_type_ids, self.ids(NODE_TYPES[known:])))
+        return self._node_type_ids
+
+    def count_ids(self, ids, owners, n):
+        #Category counts of n sentences, from the tag id of every leaf and
+        #the index of the sentence each leaf belongs to
+        n_tags = len(self._rows)
+        tag_counts = np.bincount(owners * n_tags + ids,
+                                 minlength=n * n_tags).reshape(n, n_tags)
+        return tag_counts @ self.membership
+
+    def count(self, tag_lists):
+        #Category counts of lists of tags, one row per list
+        tag_lists = [list(tags) for tags in tag_lists]
+        lengths = [len(tags) for tags in tag_lists]
+        ids = self.ids([tag for tags in tag_lists for tag in tags])
+        owners = np.repeat(np.arange(len(tag_lists)), lengths)
+        return self.count_ids(ids, owners, len(tag_lists))
+
+
+DEFAULT_TABLE = PosTable()
+
+
+def leaf_ids(tree, table):
+    #The tag ids of a tree's leaves. Compact trees already hold their leaves'
+    #interned node type ids, which only need translating.
+    arrays = getattr(tree, 'arrays', None)
+    if arrays is not None:
+        type_ids = arrays.type_ids[arrays.leaf_nodes[tree._leaf_span]]
+        return table.node_type_ids()[type_ids]
+    return table.ids([leaf.node_type for leaf in tree.leaves])
+
+
+def count_trees(trees, table=None):
+    #The category counts of many ConstituencyTrees or CompactConstituencyTrees
+    #as an array with one row per tree and one column per name of table
+    table = table or DEFAULT_TABLE
+    trees = list(trees)
+    ids = [leaf_ids(tree, table) for tree in trees]
+    owners = np.repeat(np.arange(len(trees)), [len(tree_ids) for tree_ids in ids])
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+    return table.count_ids(ids, owners, len(trees))
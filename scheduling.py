@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Length-bucketed batching for the parsers.
+
+The AllenNLP models pad every sentence of a batch to the length of its
+longest sentence, so a batch that mixes short and long sentences spends most
+of its compute on padding, and a batch of many long sentences can use a lot
+of memory. plan_batches sorts the sentences by length and cuts the sorted
+list into batches whose padded size, the number of sentences times the
+length of the longest, stays within a token budget. A sentence longer than
+the budget on its own is parsed alone. run_batches puts the results back in
+the original order of the sentences.
+
+The budget is max_tokens, by default CLAS_MAX_BATCH_TOKENS or
+DEFAULT_MAX_TOKENS, and batch_size still caps the number of sentences in a
+batch.
+
+Sorting only helps when there are many sentences to sort, so text that is
+streamed is parsed DEFAULT_WINDOW (CLAS_SCHEDULE_WINDOW) sentences at a
+time and batches are planned over the whole window.
+"""
+import os
+
+import instrumentation
+
+DEFAULT_MAX_TOKENS = int(os.environ.get('CLAS_MAX_BATCH_TOKENS', 2048))
+DEFAULT_WINDOW = int(os.environ.get('CLAS_SCHEDULE_WINDOW', 1024))
+
+
+def plan_batches(lengths, max_tokens=None, batch_size=None):
+    #Returns lists of indices into lengths, one list per batch, from the
+    #shortest sentences to the longest
+    max_tokens = max_tokens or DEFAULT_MAX_TOKENS
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    batch = []
+    for i in order:
+        #order is sorted, so sentence i is the longest of the batch so far
+        full = batch_size is not None and len(batch) >= batch_size
+        if batch and (full or (len(batch) + 1) * max(lengths[i], 1) > max_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def run_batches(items, lengths, predict, stage, max_tokens=None, batch_size=None):
+    #Calls predict with each planned batch of items and returns its outputs
+    #in the order of items. Each call is timed as the instrumentation stage
+    #named stage.
+    outputs = [None] * len(items)
+    for batch in plan_batches(lengths, max_tokens, batch_size):
+        longest = max(lengths[batch[-1]], 1)
+        with instrumentation.stage(stage, sentences=len(batch),
+                                   padded_tokens=len(batch) * longest):
+            results = predict([items[i] for i in batch])
+        for i, result in zip(batch, results):
+            outputs[i] = result
+    return outputs
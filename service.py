@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP service around get_statistics that keeps one copy of the parsers in
+memory and parses concurrent requests together in micro-batches.
+
+Requests are queued. A single batching thread takes up to max_batch_size
+sentences at a time, waiting at most max_latency seconds after the first one
+for others to arrive, and parses them as one batch. A request whose
+sentences do not all fit in the max_queue sentences the queue holds is
+refused with 503, without queueing any of them, until it drains. A request
+with more sentences than max_queue could never fit and is refused with 413.
+
+    python service.py --port 5000
+    curl -X POST localhost:5000/statistics -H 'Content-Type: application/json' \\
+         -d '{"sentence": "I would like this sentence to be graphed."}'
+
+Endpoints:
+    POST /statistics   {"sentence": text} returns the get_statistics dict,
+                       {"sentences": [text, ...]} returns a list of them
+    GET  /health       whether the service is up and which models are loaded
+    GET  /metrics      queue, batch and parse cache figures
+
+Run with --stub to use stub_predictors instead of the AllenNLP models.
+"""
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import models
+import parse_cache
+
+
+class QueueFull(Exception):
+    pass
+
+
+class RequestTooLarge(Exception):
+    #A request with more sentences than the whole queue holds, which no
+    #amount of waiting lets in
+    pass
+
+
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch_size=32, max_latency=0.01,
+                 max_queue=1024):
+        #process_batch takes a list of sentences and returns one result each
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.sentences = 0
+        self.rejected = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, sentences):
+        #Returns a Future for each sentence's result. Either every sentence
+        #is queued or, when the queue has no room for all of them, none is
+        #and QueueFull is raised. RequestTooLarge means they could never
+        #fit. Submitters hold the lock while queueing and the batching
+        #thread only takes sentences off, so the room that is checked
+        #cannot shrink before the sentences are put.
+        futures = [Future() for _ in sentences]
+        if 0 < self._queue.maxsize < len(sentences):
+            with self._lock:
+                self.rejected += 1
+            raise RequestTooLarge(f'{len(sentences)} sentences, but at most '
+                                  f'{self._queue.maxsize} can be queued at once')
+        with self._lock:
+            room = self._queue.maxsize - self._queue.qsize()
+            if self._queue.maxsize > 0 and len(sentences) > room:
+                self.rejected += 1
+                raise QueueFull(f'{self._queue.maxsize} sentences already queued')
+            for sentence, future in zip(sentences, futures):
+                self._queue.put_nowait((sentence, future))
+        return futures
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            sentences = [sentence for sentence, _ in batch]
+            try:
+                results = self.process_batch(sentences)
+            except Exception:
+                #One bad sentence should not fail the others, so the batch is
+                #retried a sentence at a time
+                results = []
+                for sentence in sentences:
+                    try:
+                        results.extend(self.process_batch([sentence]))
+                    except Exception as error:
+                        results.append(error)
+            with self._lock:
+                self.batches += 1
+                self.sentences += len(batch)
+                self.busy_seconds += time.perf_counter() - start
+            for (_, future), result in zip(batch, results):
+                self._deliver(future, result)
+
+    def _deliver(self, future, result):
+        #A future whose request has given up is skipped, and a failure to
+        #set one future must not end the batching thread
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            if isinstance(result, Exception):
+                with self._lock:
+                    self.errors += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                    'queued': self._queue.qsize(),
+                    'max_queue': self._queue.maxsize,
+                    'batches': self.batches,
+                    'sentences': self.sentences,
+                    'mean_batch_size': self.sentences / self.batches if self.batches else 0,
+                    'rejected': self.rejected,
+                    'errors': self.errors,
+                    'busy_seconds': self.busy_seconds,
+            }
+
+
+def statistics_batch(sentences, engine='allennlp'):
+    #The get_statistics dict of each sentence, parsing the batch together
+    from depth import parse_sentences, tree_statistics
+    constituency_trees, dependency_trees = parse_sentences(sentences, engine)
+    return [tree_statistics(sentence, ct, dt)
+            for sentence, ct, dt in zip(sentences, constituency_trees, dependency_trees)]
+
+
+def create_app(batcher, timeout=60):
+    from flask import Flask, jsonify, request
+    app = Flask(__name__)
+
+    @app.route('/statistics', methods=['POST'])
+    def statistics():
+        body = request.get_json(force=True, silent=True) or {}
+        single = 'sentence' in body
+        sentences = [body['sentence']] if single else body.get('sentences')
+        if not isinstance(sentences, list) or not all(
+                isinstance(sentence, str) for sentence in sentences):
+            return jsonify(error='expected {"sentence": text} or {"sentences": [text, ...]}'), 400
+        try:
+            futures = batcher.submit(sentences)
+        except RequestTooLarge as error:
+            return jsonify(error=str(error) + '; send the sentences in smaller requests'), 413
+        except QueueFull as error:
+            response = jsonify(error=str(error))
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        try:
+            results = [future.result(timeout) for future in futures]
+        except Exception as error:
+            for future in futures:
+                future.cancel()
+            return jsonify(error=f'{type(error).__name__}: {error}'), 500
+        return jsonify(results[0] if single else results)
+
+    @app.route('/health')
+    def health():
+        return jsonify(status='ok', models={
+                name: models.is_loaded(name) for name in ('constituency', 'dependency')})
+
+    @app.route('/metrics')
+    def metrics():
+        cache = parse_cache.get_cache()
+        return jsonify(batcher=batcher.stats, parse_cache=cache.stats if cache else None)
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve get_statistics over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--engine', default='allennlp')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-latency-ms', type=float, default=10)
+    parser.add_argument('--max-queue', type=int, default=1024)
+    parser.add_argument('--stub', action='store_true',
+                        help='use stub predictors instead of the AllenNLP models')
+    args = parser.parse_args(argv)
+    if args.stub:
+        import stub_predictors
+        stub_predictors.install()
+    else:
+        models.preload('constituency', 'dependency')
+    batcher = MicroBatcher(lambda sentences: statistics_batch(sentences, args.engine),
+                           args.max_batch_size, args.max_latency_ms / 1000,
+                           args.max_queue)
+    create_app(batcher).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
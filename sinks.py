@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Writers that take statistics rows one at a time and write them out in
+bounded-size chunks, so that output appears while a long text is still being
+parsed and memory use does not grow with its length.
+
+Every sink buffers at most chunk_size rows before writing them and flushing
+the file. Sinks are context managers; leaving the with block writes whatever
+is left in the buffer and closes the file if the sink opened it.
+
+>>> with CSVSink('statistics.csv') as sink:
+...     sink.write_all(iter_paragraph_statistics(text))
+"""
+import csv
+import io
+import os
+
+from stats_schema import PIPE_FIELDS
+
+
+class Sink:
+    def __init__(self, file, fields=None, chunk_size=256):
+        #file is a path or an already open file. fields defaults to the keys
+        #of the first row written.
+        self._owns_file = isinstance(file, str)
+        self.file = self.open(file) if self._owns_file else file
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._buffer = []
+
+    def open(self, path):
+        return open(path, 'w', newline='')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, row):
+        if self.fields is None:
+            self.fields = list(row.keys())
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def write_all(self, rows):
+        for row in rows:
+            self.write(row)
+        return self
+
+    def flush(self):
+        if self._buffer:
+            self.write_chunk(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+        self.file.flush()
+
+    def write_chunk(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+
+class PipeSink(Sink):
+    #The pipe-delimited text table of process_sentences and Paragraph.__repr__
+    def __init__(self, file, fields=PIPE_FIELDS, chunk_size=256):
+        super().__init__(file, fields, chunk_size)
+        self.file.write('|'.join(self.fields) + '\n')
+
+    def write_chunk(self, rows):
+        self.file.write(''.join(
+                '|'.join(str(row[field]) for field in self.fields) + '\n'
+                for row in rows))
+
+
+class CSVSink(Sink):
+    #index=True adds a leading unnamed column numbering the rows, which is
+    #the layout DataFrame.to_csv produces, with the same line endings
+    def __init__(self, file, fields=None, chunk_size=256, index=False):
+        super().__init__(file, fields, chunk_size)
+        self.index = index
+        self._writer = csv.writer(self.file, lineterminator=os.linesep)
+
+    def write_chunk(self, rows):
+        if not self.rows_written:
+            self._writer.writerow(([''] if self.index else []) + self.fields)
+        self._writer.writerows(
+                ([self.rows_written + i] if self.index else [])
+                + [row.get(field) for field in self.fields]
+                for i, row in enumerate(rows))
+
+
+class ParquetSink(Sink):
+    #Writes each chunk as one parquet row group. Needs pyarrow.
+    #Every chunk is written with the schema of the first, which takes the
+    #type of each statistics field from stats_schema.SCHEMA rather than from
+    #the values of the first chunk, so that a total_Fdepth of 3 in the first
+    #chunk and 3.5 in a later one both go in a double column.
+    ARROW_TYPES = {'int64': 'int64', 'Int64': 'int64', 'float64': 'float64',
+                   'object': 'string'}
+
+    def open(self, path):
+        return open(path, 'wb')
+
+    def schema(self, frame):
+        import pyarrow as pa
+        from stats_schema import DTYPES
+        inferred = pa.Schema.from_pandas(frame, preserve_index=False)
+        return pa.schema([
+                pa.field(field, getattr(pa, self.ARROW_TYPES[DTYPES[field]])())
+                if field in DTYPES else inferred.field(field)
+                for field in self.fields])
+
+    def write_chunk(self, rows):
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        frame = pd.DataFrame(rows, columns=self.fields)
+        if not hasattr(self, '_writer'):
+            self._schema = self.schema(frame)
+            self._writer = pq.ParquetWriter(self.file, self._schema)
+        self._writer.write_table(pa.Table.from_pandas(
+                frame, schema=self._schema, preserve_index=False))
+
+    def close(self):
+        self.flush()
+        if hasattr(self, '_writer'):
+            self._writer.close()
+        if self._owns_file:
+            self.file.close()
+
+
+def pipe_table(rows, fields=PIPE_FIELDS):
+    #Formats rows as the pipe-delimited text table
+    output = io.StringIO()
+    with PipeSink(output, fields) as sink:
+        sink.write_all(rows)
+    return output.getvalue()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sentence splitting for depth.py.
+
+Two modes are available:
+    'full'         the whole en_core_web_sm pipeline, whose dependency parse
+                   places the sentence boundaries
+    'sentencizer'  spaCy's rule-based sentencizer on a blank English
+                   pipeline, which is much faster and splits on punctuation
+The default is 'full', or the CLAS_SPLIT_MODE environment variable, and can be
+changed with set_mode.
+
+parsed_spans always splits with a pipeline that has a dependency parser,
+falling back to 'full' for the sentencizer, so that the spans carry a
+dependency parse that depth.py's 'spacy' dependency engine can reuse.
+
+Texts longer than the pipeline's max_length are split into chunks at
+paragraph, line or sentence breaks, and the chunks are split separately,
+instead of spaCy raising an error.
+"""
+import os
+import re
+
+import instrumentation
+import models
+
+MODES = {'full': 'sentence_splitter', 'sentencizer': 'sentencizer'}
+
+_mode = os.environ.get('CLAS_SPLIT_MODE', 'full')
+
+
+def _load_sentencizer():
+    import spacy
+    nlp = spacy.blank('en')
+    if int(spacy.__version__.split('.')[0]) < 3:
+        nlp.add_pipe(nlp.create_pipe('sentencizer'))
+    else:
+        nlp.add_pipe('sentencizer')
+    return nlp
+
+
+models.register('sentencizer', _load_sentencizer)
+
+
+def set_mode(mode):
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f'unknown split mode {mode!r}, expected one of {list(MODES)}')
+    _mode = mode
+
+
+def get_pipeline(mode=None):
+    mode = mode or _mode
+    if mode not in MODES:
+        raise ValueError(f'unknown split mode {mode!r}, expected one of {list(MODES)}')
+    return models.get(MODES[mode])
+
+
+#Places a chunk may be cut, from most to least preferable
+_BREAKS = [re.compile(r'\n\s*\n'), re.compile(r'\n'),
+           re.compile(r'[.!?]["\')\]]*\s+'), re.compile(r'\s+')]
+
+
+def chunk_text(text, max_length):
+    #Cuts text into pieces of at most max_length characters, as late as
+    #possible and at the most preferable kind of break available
+    chunks = []
+    start = 0
+    while len(text) - start > max_length:
+        window = text[start:start + max_length]
+        cut = max_length
+        for pattern in _BREAKS:
+            ends = [match.end() for match in pattern.finditer(window)]
+            if ends and ends[-1] > 0:
+                cut = ends[-1]
+                break
+        chunks.append(text[start:start + cut])
+        start += cut
+    chunks.append(text[start:])
+    return chunks
+
+
+def split_docs(text, mode=None):
+    #The spaCy Docs of text, one per chunk of at most max_length characters
+    nlp = get_pipeline(mode)
+    with instrumentation.stage('split', characters=len(text)):
+        return [nlp(chunk) for chunk in chunk_text(text, nlp.max_length)]
+
+
+def split_spans(text, mode=None):
+    #The sentences of text as spaCy Spans, leaving out whitespace between
+    #chunks or paragraphs that the splitter returns as a sentence of its own
+    return [sentence for doc in split_docs(text, mode) for sentence in doc.sents
+            if sentence.text.strip()]
+
+
+def parser_mode(mode=None):
+    #mode, or 'full' if the pipeline of mode has no dependency parser
+    mode = mode or _mode
+    return mode if 'parser' in get_pipeline(mode).pipe_names else 'full'
+
+
+def has_parse(doc):
+    #Whether a Doc carries a dependency parse, in spaCy 2 and 3
+    if hasattr(doc, 'has_annotation'):
+        return doc.has_annotation('DEP')
+    return doc.is_parsed
+
+
+def parsed_spans(text, mode=None):
+    #The sentences of text as spaCy Spans with their dependency parse
+    return split_spans(text, parser_mode(mode))
+
+
+def split_sentences(text, mode=None):
+    #The sentences of text as strings
+    return [str(sentence) for sentence in split_spans(text, mode)]
+
+
+def split_documents(texts, mode=None, n_process=1, batch_size=64):
+    #Splits many texts at once with nlp.pipe and returns one list of sentence
+    #strings per text. n_process > 1 splits in that many processes.
+    nlp = get_pipeline(mode)
+    owners, chunks = [], []
+    texts = list(texts)
+    for i, text in enumerate(texts):
+        for chunk in chunk_text(text, nlp.max_length):
+            owners.append(i)
+            chunks.append(chunk)
+    if n_process > 1:
+        try:
+            docs = nlp.pipe(chunks, batch_size=batch_size, n_process=n_process)
+        except TypeError:
+            #spaCy before 2.2 has no n_process, so fall back to a process pool
+            return _split_documents_in_pool(texts, mode or _mode, n_process)
+    else:
+        docs = nlp.pipe(chunks, batch_size=batch_size)
+    sentences = [[] for _ in texts]
+    for owner, doc in zip(owners, docs):
+        sentences[owner].extend(str(sentence) for sentence in doc.sents
+                                if sentence.text.strip())
+    return sentences
+
+
+def _split_with_mode(job):
+    text, mode = job
+    return split_sentences(text, mode)
+
+
+def _split_documents_in_pool(texts, mode, n_process):
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=n_process) as pool:
+        return list(pool.map(_split_with_mode, [(text, mode) for text in texts],
+                             chunksize=max(1, len(texts) // (n_process * 4))))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The fields of a statistics row: their order, their dtype and where each
+comes from.
+
+This is kept apart from stats_table, which builds pandas tables from it, so
+that depth and sinks can build rows without importing pandas.
+"""
+
+#(field, dtype, source). The source is the sentence itself, or the
+#constituency or dependency tree whose attribute of the same name holds
+#the value.
+SCHEMA = [
+        ('sentenceID', 'int64', None),
+        ('sentence_text', 'object', 'sentence'),
+        ('num_clauses', 'Int64', 'constituency'),
+        ('mean_Fdepth', 'float64', 'constituency'),
+        ('total_Fdepth', 'float64', 'constituency'),
+        ('max_Fdepth', 'float64', 'constituency'),
+        ('mean_Ydepth', 'float64', 'constituency'),
+        ('total_Ydepth', 'Int64', 'constituency'),
+        ('max_Ydepth', 'Int64', 'constituency'),
+        ('mean_SynDepLen', 'float64', 'dependency'),
+        ('total_SynDepLen', 'Int64', 'dependency'),
+        ('max_SynDepLen', 'Int64', 'dependency'),
+        ('noun_count', 'Int64', 'constituency'),
+        ('adj_count', 'Int64', 'constituency'),
+        ('adverb_count', 'Int64', 'constituency'),
+        ('verb_count', 'Int64', 'constituency'),
+        ('det_count', 'Int64', 'constituency'),
+        ('conj_count', 'Int64', 'constituency'),
+        ('prep_count', 'Int64', 'constituency'),
+        ('properN_count', 'Int64', 'constituency'),
+]
+
+FIELDS = [field for field, _, _ in SCHEMA]
+DTYPES = {field: dtype for field, dtype, _ in SCHEMA}
+#Every field but sentenceID, in order
+STATISTICS_FIELDS = FIELDS[1:]
+#The pipe-delimited report leaves out the maxima
+PIPE_FIELDS = [field for field in FIELDS if not field.startswith('max_')]
+
+#(column, field, side). The columns of compare_paragraphs, each taking field
+#from the statistics of the manual or automatic parse
+COMPARISON_SCHEMA = [
+        ('Max Y', 'max_Ydepth', 'manual'),
+        ('Auto Max Y', 'max_Ydepth', 'auto'),
+        ('Total Y', 'total_Ydepth', 'manual'),
+        ('Max F', 'max_Fdepth', 'manual'),
+        ('Auto Max F', 'max_Fdepth', 'auto'),
+        ('Total F', 'total_Fdepth', 'manual'),
+        ('Auto Total F', 'total_Fdepth', 'auto'),
+        ('Total Dep', 'total_SynDepLen', 'manual'),
+        ('Auto Total Dep', 'total_SynDepLen', 'auto'),
+        ('Max Dep', 'max_SynDepLen', 'manual'),
+        ('Auto Max Dep', 'max_SynDepLen', 'auto'),
+]
+
+
+def tree_row(sentence, ct, dt):
+    #One statistics row, without sentenceID, as a dict
+    row = {}
+    for field, _, source in SCHEMA[1:]:
+        if source == 'sentence':
+            row[field] = sentence
+        elif source == 'constituency':
+            row[field] = getattr(ct, field) if ct is not None else None
+        else:
+            row[field] = getattr(dt, field) if dt is not None else None
+    return row
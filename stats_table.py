@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The sentence statistics as a typed, columnar pandas table.
+
+SCHEMA, in stats_schema, is the one definition of the statistics fields:
+their order, their dtype and where each comes from. The rows of
+depth.tree_statistics, the columns of the tables built here and the reports
+of sinks are all derived from it.
+
+Integer columns use pandas' nullable Int64 dtype, so a statistic that does
+not apply to a sentence (the SynDepLen of a sentence without a dependency
+tree, or the constituency fields of a CoNLL-U corpus) is missing rather than
+turning the column into floats or objects.
+
+>>> table = paragraph.statistics_table
+>>> summarize(concat(tables, keys=names, name='paragraph'), by='paragraph')
+"""
+import numpy as np
+import pandas as pd
+
+import pos_tally
+from stats_schema import DTYPES, FIELDS, SCHEMA
+
+
+def _typed(columns, index=None):
+    #Builds the table with the SCHEMA dtypes from a dict of columns
+    table = pd.DataFrame(columns, columns=FIELDS, index=index)
+    return table.astype(DTYPES)
+
+
+def from_trees(sentences, constituency_trees, dependency_trees, start=0):
+    #Builds the table column by column straight from parsed trees, numbering
+    #the sentences from start
+    n = len(sentences)
+    columns = {'sentenceID': np.arange(start, start + n, dtype=np.int64),
+               'sentence_text': list(sentences)}
+    if all(tree is not None for tree in constituency_trees):
+        #The part of speech counts of all the trees come from one bincount
+        counts = pos_tally.count_trees(constituency_trees)
+        for i, name in enumerate(pos_tally.DEFAULT_TABLE.names):
+            if name in DTYPES:
+                columns[name] = counts[:, i]
+    for field, _, source in SCHEMA[2:]:
+        if field in columns:
+            continue
+        trees = constituency_trees if source == 'constituency' else dependency_trees
+        columns[field] = [getattr(tree, field) if tree is not None else None
+                          for tree in trees]
+    return _typed(columns)
+
+
+def from_rows(rows):
+    #Builds the table from statistics rows, such as those of
+    #get_paragraph_statistics or iter_conllu_statistics
+    rows = list(rows)
+    return _typed({field: [row.get(field) for row in rows] for field in FIELDS})
+
+
+def records(table):
+    #The rows of a table as dicts of plain Python values, with None for
+    #missing values, for the row-at-a-time sinks
+    table = table.astype(object)
+    return table.where(table.notna(), None).to_dict('records')
+
+
+def concat(tables, keys=None, name='paragraph'):
+    #Joins the tables of many paragraphs or files in one step. With keys, a
+    #categorical column called name records which table each row came from,
+    #for grouping with summarize and distribution.
+    tables = list(tables)
+    table = pd.concat(tables, ignore_index=True, sort=False) if tables else _typed({})
+    if keys is not None:
+        keys = list(keys)
+        lengths = [len(t) for t in tables]
+        table.insert(0, name, pd.Categorical(
+                np.repeat(np.array(keys, dtype=object), lengths),
+                categories=pd.unique(np.array(keys, dtype=object))))
+    return table
+
+
+def summarize(table, by=None):
+    #Paragraph- or corpus-level aggregates: the number of sentences, the
+    #mean of every mean, the maximum of every maximum and the sum of every
+    #total and part of speech count. by groups the rows first, by a column
+    #name such as the key column of concat or by anything groupby accepts.
+    aggregates = {'sentences': ('sentence_text', 'size')}
+    for field in FIELDS[2:]:
+        if field.startswith('mean_'):
+            aggregates[field] = (field, 'mean')
+        elif field.startswith('max_'):
+            aggregates[field] = (field, 'max')
+        else:
+            aggregates[field] = (field, 'sum')
+    if by is None:
+        return pd.Series({column: len(table) if how == 'size' else table[field].agg(how)
+                          for column, (field, how) in aggregates.items()})
+    return table.groupby(by, observed=True, sort=False).agg(**aggregates)
+
+
+def distribution(table, field, bins=None, by=None):
+    #How often each value of field occurs, or with bins (a number of bins or
+    #their edges) how many values fall in each bin, per group of by if given
+    values = table[field]
+    if bins is not None:
+        values = pd.cut(values.astype('float64'), bins)
+    if by is None:
+        return values.value_counts(sort=False).sort_index()
+    grouper = table[by] if isinstance(by, str) else by
+    counts = values.groupby(grouper, observed=True).value_counts(sort=False)
+    return counts.sort_index().unstack(fill_value=0)
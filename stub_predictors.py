@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stand-ins for the AllenNLP predictors, for running depth.py without the
+neural models: in benchmarks, in the analysis service during local testing,
+and anywhere else the parses themselves do not matter.
+
+A StubPredictor replays recorded predictor outputs from a fixture file and
+makes up a synthetic parse for any other sentence. install puts stubs for
+both parsers into the models registry.
+"""
+import json
+import os
+
+import models
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'benchmarks', 'fixtures', 'hierplane.json')
+
+
+class StubPredictor:
+    #Offers the predict methods of an AllenNLP Predictor that depth.py uses
+    def __init__(self, outputs, fallback):
+        self.outputs = outputs
+        self.fallback = fallback
+        self.calls = 0
+
+    def predict(self, sentence):
+        self.calls += 1
+        if sentence in self.outputs:
+            return self.outputs[sentence]
+        return self.fallback(sentence.split())
+
+    def predict_json(self, inputs):
+        return self.predict(inputs['sentence'])
+
+    def predict_batch_json(self, inputs):
+        return [self.predict_json(i) for i in inputs]
+
+    #analysis.py tokenizes once and hands both predictors the same tokens
+    def tokenize(self, sentence):
+        output = self.outputs.get(sentence, {})
+        words = output.get('tokens') or output.get('words') or sentence.split()
+        return [(word, 'NN', 'NOUN') for word in words]
+
+    def predict_tokens(self, token_lists):
+        if not hasattr(self, '_by_tokens'):
+            self._by_tokens = {
+                    ' '.join(output.get('tokens') or output.get('words')): output
+                    for output in self.outputs.values()}
+        self.calls += len(token_lists)
+        return [self._by_tokens.get(' '.join(words)) or self.fallback(words)
+                for words in token_lists]
+
+
+def load_fixtures(path=FIXTURES):
+    with open(path) as f:
+        return json.load(f)
+
+
+def install(path=FIXTURES):
+    #Puts stub predictors for both parsers into the models registry and
+    #returns them as (constituency, dependency)
+    fixtures = load_fixtures(path)
+    constituency = StubPredictor(fixtures['constituency'], synthetic_constituency)
+    dependency = StubPredictor(fixtures['dependency'], synthetic_dependency)
+    models.set('constituency', constituency)
+    models.set('dependency', dependency)
+    return constituency, dependency
+
+
+def _leaf(word, node_type='NN'):
+    return {'word': word, 'nodeType': node_type, 'attributes': [node_type],
+            'link': node_type}
+
+
+def synthetic_constituency(words):
+    #A right branching parse of words, as a constituency predictor output
+    node = _leaf(words[-1])
+    for i in range(len(words) - 2, -1, -1):
+        node = {'word': ' '.join(words[i:]), 'nodeType': 'VP' if i else 'S',
+                'attributes': ['VP' if i else 'S'], 'link': 'VP' if i else 'S',
+                'children': [_leaf(words[i]), node]}
+    return {'hierplane_tree': {'text': ' '.join(words), 'root': node}}
+
+
+def synthetic_dependency(words, heads=None):
+    #A dependency predictor output for words. heads gives the 1-based head of
+    #each word, 0 for the root; by default every word depends on the one
+    #before it.
+    if heads is None:
+        heads = list(range(len(words)))
+    starts = []
+    start = 0
+    for word in words:
+        starts.append(start)
+        start += len(word) + 1
+    nodes = [{'word': word, 'nodeType': 'dep', 'attributes': ['NN'], 'link': 'dep',
+              'spans': [{'start': begin, 'end': begin + len(word)}]}
+             for word, begin in zip(words, starts)]
+    root = None
+    for node, head in zip(nodes, heads):
+        if head == 0:
+            root = node
+        else:
+            nodes[head - 1].setdefault('children', []).append(node)
+    return {'hierplane_tree': {'text': ' '.join(words), 'root': root}}
+
+
+def deep_constituency(depth):
+    #A constituency tree nested depth levels deep, alternating S and VP
+    #nodes, each with a leaf on one side
+    node = _leaf('end')
+    for i in range(depth):
+        node_type = 'S' if i % 3 == 0 else 'VP'
+        children = [_leaf('the', 'DT'), node] if i % 2 else [node, _leaf('a')]
+        node = {'word': '', 'nodeType': node_type, 'attributes': [node_type],
+                'link': node_type, 'children': children}
+    return {'hierplane_tree': {'text': '', 'root': node}}
+
+
+def wide_constituency(width):
+    #A single S node with width leaves
+    root = {'word': '', 'nodeType': 'S', 'attributes': ['S'], 'link': 'S',
+            'children': [_leaf(f'w{i}', ['NN', 'VB', 'JJ', 'DT'][i % 4])
+                         for i in range(width)]}
+    return {'hierplane_tree': {'text': '', 'root': root}}
+
+
+def deep_dependency(length):
+    #A chain of length words, each depending on the one before it
+    return synthetic_dependency([f'w{i}' for i in range(length)])
+
+
+def wide_dependency(length):
+    #length words that all depend on the first
+    return synthetic_dependency([f'w{i}' for i in range(length)],
+                                [0] + [1] * (length - 1))
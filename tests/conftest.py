@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#The modules of this repository sit at its top level rather than in a package
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+import splitting
+import stub_predictors
+
+STUBBED = ('constituency', 'dependency')
+
+
+@pytest.fixture
+def stubs():
+    #The stub predictors and the rule-based sentencizer for the duration of a
+    #test, putting back whatever models and split mode were there before
+    mode = splitting._mode
+    previous = {name: models._models.get(name) for name in STUBBED}
+    stub_predictors.install()
+    splitting.set_mode('sentencizer')
+    yield
+    splitting.set_mode(mode)
+    for name, model in previous.items():
+        if model is None:
+            models.unload(name)
+        else:
+            models.set(name, model)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Sentence alignment and the comparison table of agreement.py, on paragraphs
+#built from bracketed trees
+import agreement
+from depth import Paragraph
+
+TREES = {
+        'I like trees .': ('(ROOT (S (NP (PRP I)) (VP (VBP like) (NP (NNS trees))) (. .)))',
+                           'nsubj(like-2, I-1)\nroot(ROOT-0, like-2)\n'
+                           'dobj(like-2, trees-3)\npunct(like-2, .-4)'),
+        'Dogs bark .': ('(ROOT (S (NP (NNS Dogs)) (VP (VBP bark)) (. .)))',
+                        'nsubj(bark-2, Dogs-1)\nroot(ROOT-0, bark-2)\npunct(bark-2, .-3)'),
+        'Dogs bark and cats mew .': (
+                '(ROOT (S (S (NP (NNS Dogs)) (VP (VBP bark))) (CC and) '
+                '(S (NP (NNS cats)) (VP (VBP mew))) (. .)))',
+                'nsubj(bark-2, Dogs-1)\nroot(ROOT-0, bark-2)\ncc(bark-2, and-3)\n'
+                'nsubj(mew-5, cats-4)\nconj(bark-2, mew-5)\npunct(bark-2, .-6)'),
+        'And cats mew .': ('(ROOT (S (CC And) (NP (NNS cats)) (VP (VBP mew)) (. .)))',
+                           'cc(mew-3, And-1)\nnsubj(mew-3, cats-2)\nroot(ROOT-0, mew-3)\n'
+                           'punct(mew-3, .-4)'),
+}
+
+
+def paragraph(sentences, dirname):
+    return Paragraph(constituency_trees=[TREES[s][0] for s in sentences],
+                     dependency_trees=[TREES[s][1] for s in sentences], dirname=dirname)
+
+
+def test_groups_cover_sentences_without_edges_of_their_own():
+    groups = agreement.align(['Hello world .', 'xyz .', 'Second half here .'],
+                             ['Hello world . Second half here .'])
+    assert [(autos, manuals) for autos, manuals, _ in groups] == [([0, 1, 2], [0])]
+    assert groups[0][2] < 1
+
+
+def test_split_sentences_keep_their_rows():
+    auto = paragraph(['I like trees .', 'Dogs bark .', 'And cats mew .'], 'a')
+    manual = paragraph(['I like trees .', 'Dogs bark and cats mew .'], 'm')
+    frame = agreement.sentence_pairs(auto, manual, 'F')
+    assert list(frame['kind']) == ['aligned', 'boundary']
+    assert frame.loc[1, ['auto_first', 'auto_last', 'manual_first']].tolist() == [1, 2, 1]
+    table = agreement.comparison_table(frame)
+    assert list(table['index']) == ['F0', 'F1']
+    assert list(table['kind']) == ['aligned', 'boundary']
+    assert table.loc[1, 'Max Y':'Auto Max Dep'].isna().all()
+    assert not table.loc[0, 'Max Y':'Auto Max Dep'].isna().any()
+    report = agreement.report(frame)
+    assert report['sentences']['boundary'] == 1
+    assert report['brackets']['labeled']['f1'] == 1.0
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Checkpointed process_multiple_manual runs: the manifest, resuming, retrying
+#failed files, parsing changed files again and quarantining tracebacks
+import json
+import os
+import warnings
+
+import pandas as pd
+import pytest
+
+import checkpoint
+import depth
+
+pytestmark = pytest.mark.usefixtures('stubs')
+
+GOOD = '''Here: I like trees. Dogs bark.
+(ROOT
+  (S (NP (PRP I))
+    (VP (VBP like) (NP (NNS trees)))
+    (. .)))
+
+nsubj(like-2, I-1)
+root(ROOT-0, like-2)
+dobj(like-2, trees-3)
+punct(like-2, .-4)
+
+(ROOT
+  (S (NP (NNS Dogs)) (VP (VBP bark)) (. .)))
+
+nsubj(bark-2, Dogs-1)
+root(ROOT-0, bark-2)
+punct(bark-2, .-3)
+Str: two sentences
+'''
+
+#No Here: marker, so parse_manual_annotated raises
+BAD = 'I like trees.\n'
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    #Runs process_multiple_manual over one good and one bad file in tmp_path
+    #and returns what was parsed and the manifest afterwards
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(depth.Paragraph, 'graph', lambda self, *args, **kwargs: None)
+    parsed = []
+    process_manual_file = depth.process_manual_file
+
+    def counting(path, dirname):
+        parsed.append(dirname)
+        return process_manual_file(path, dirname)
+
+    monkeypatch.setattr(depth, 'process_manual_file', counting)
+    (tmp_path / 'good.txt').write_text(GOOD)
+    (tmp_path / 'bad.txt').write_text(BAD)
+
+    def run(retry_failed=False):
+        del parsed[:]
+        with warnings.catch_warnings(record=True) as warned:
+            warnings.simplefilter('always')
+            frame = depth.process_multiple_manual(
+                    ['good.txt', 'bad.txt'], ['good', 'bad'], output='out.csv',
+                    checkpoint_dir='checkpoints', retry_failed=retry_failed)
+        return frame, list(parsed), checkpoint.Manifest('checkpoints'), warned
+    return run
+
+
+def entry(manifest, path, dirname):
+    return manifest.files[checkpoint.Manifest.key(path, dirname)]
+
+
+def test_first_run_records_and_quarantines(run):
+    frame, parsed, manifest, warned = run()
+    assert parsed == ['good', 'bad']
+    assert set(frame['file']) == {'good'}
+    assert entry(manifest, 'good.txt', 'good')['status'] == 'done'
+    assert entry(manifest, 'good.txt', 'good')['sentences'] == len(frame)
+    assert entry(manifest, 'good.txt', 'good')['format'] == checkpoint.RESULT_FORMAT
+    failed = entry(manifest, 'bad.txt', 'bad')
+    assert failed['status'] == 'failed'
+    with open(os.path.join('checkpoints', failed['traceback'])) as f:
+        traceback = f.read()
+    assert traceback.startswith('Traceback')
+    assert failed['error'] == traceback.strip().splitlines()[-1]
+    assert any('bad.txt failed and was quarantined' in str(w.message) for w in warned)
+    assert len(pd.read_csv('out.csv')) > 0
+
+
+def test_restart_skips_finished_and_failed_files(run):
+    first, _, _, _ = run()
+    frame, parsed, manifest, _ = run()
+    assert parsed == []
+    pd.testing.assert_frame_equal(frame, first)
+    assert len(manifest.finished()) == 1 and len(manifest.failed()) == 1
+    with open(os.path.join('checkpoints', checkpoint.MANIFEST)) as f:
+        assert len(json.load(f)['files']) == 2
+
+
+def test_retry_failed(run, tmp_path):
+    run()
+    _, parsed, manifest, _ = run(retry_failed=True)
+    assert parsed == ['bad']
+    assert entry(manifest, 'bad.txt', 'bad')['status'] == 'failed'
+    (tmp_path / 'bad.txt').write_text(GOOD)
+    frame, parsed, manifest, _ = run(retry_failed=True)
+    assert parsed == ['bad']
+    assert entry(manifest, 'bad.txt', 'bad')['status'] == 'done'
+    assert set(frame['file']) == {'good', 'bad'}
+
+
+def test_changed_files_are_parsed_again(run, tmp_path):
+    run()
+    (tmp_path / 'good.txt').write_text(GOOD.replace('two sentences', 'edited'))
+    (tmp_path / 'bad.txt').write_text(GOOD)
+    frame, parsed, manifest, _ = run()
+    assert parsed == ['good', 'bad']
+    assert manifest.failed() == []
+    assert list(frame['file'].unique()) == ['good', 'bad']
+
+
+def test_results_of_an_older_format_are_parsed_again(run, monkeypatch):
+    run()
+    monkeypatch.setattr(checkpoint, 'RESULT_FORMAT', checkpoint.RESULT_FORMAT + 1)
+    _, parsed, _, _ = run()
+    assert parsed == ['good']
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#The metric-only CoNLL-U reader against the full DependencyTree path
+import io
+import random
+
+import pytest
+
+pytest.importorskip('conllu')
+
+from conllu_corpus import iter_conllu_statistics, iter_conllu_trees
+from depth import DependencyTree
+
+
+def corpus(rng, sentences=300):
+    lines = []
+    for s in range(sentences):
+        n = rng.randint(1, 20)
+        lines.append(f'# text = sentence {s}')
+        for i in range(1, n + 1):
+            head = 0 if i == 1 else rng.randint(1, n)
+            lines.append(f'{i}\tw{i}\tw\tNOUN\tNN\t_\t{head}\tdep\t_\t_')
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def test_fast_path_matches_trees():
+    text = corpus(random.Random(3))
+    rows = list(iter_conllu_statistics([io.StringIO(text)], batch_size=64))
+    trees = [tree for _, tree in iter_conllu_trees([io.StringIO(text)])]
+    assert len(rows) == len(trees) == 300
+    with_relations = [i for i, tree in enumerate(trees) if tree is not None]
+    batch = DependencyTree.batch_SynDepLen([trees[i] for i in with_relations])
+    for j, i in enumerate(with_relations):
+        assert rows[i]['total_SynDepLen'] == trees[i].total_SynDepLen == batch['total_SynDepLen'][j]
+        assert rows[i]['max_SynDepLen'] == trees[i].max_SynDepLen == batch['max_SynDepLen'][j]
+        assert rows[i]['mean_SynDepLen'] == pytest.approx(trees[i].mean_SynDepLen)
+    for i, tree in enumerate(trees):
+        if tree is None:
+            assert rows[i]['total_SynDepLen'] is None
+            assert rows[i]['mean_SynDepLen'] is None and rows[i]['max_SynDepLen'] is None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#The iterative depth scores of ConstituencyTree and CompactConstituencyTree,
+#on pathological trees too deep for recursion and against a recursive
+#reference of the original definitions on trees small enough for it
+import random
+import sys
+
+import pytest
+
+from depth import ConstituencyTree
+
+FIELDS = ['num_clauses', 'total_Ydepth', 'total_Fdepth', 'mean_Ydepth',
+          'mean_Fdepth', 'max_Ydepth', 'max_Fdepth']
+
+
+def leaf(word='w', tag='NN'):
+    return ConstituencyTree(tag, word=word)
+
+
+def right_branching(depth):
+    #(S (NN w) (S (NN w) (S ...))), two nodes per level
+    tree = leaf()
+    for i in range(depth):
+        tree = ConstituencyTree('S' if i % 2 else 'VP', [leaf(), tree])
+    return tree
+
+
+def left_branching(depth):
+    #(S (S (S ...) (NN w)) (NN w))
+    tree = leaf()
+    for i in range(depth):
+        tree = ConstituencyTree('S' if i % 2 else 'NP', [tree, leaf()])
+    return tree
+
+
+def wide(width):
+    return ConstituencyTree('S', [leaf(str(i)) for i in range(width)])
+
+
+def random_tree(rng, depth=0):
+    if depth > 6 or (depth and rng.random() < 0.3):
+        return leaf(tag=rng.choice(['NN', 'VB', 'DT']))
+    return ConstituencyTree(rng.choice(['S', 'NP', 'VP']),
+                            [random_tree(rng, depth + 1) for _ in range(rng.randint(1, 4))])
+
+
+def reference(tree):
+    #The scores as originally defined, by recursion over the tree: Yngve
+    #sums the siblings to the right along the path from the root, Frazier
+    #sums 1.5 (under an S) or 1 for each leftmost child up the chain of
+    #leftmost children that ends the leaf's path
+    leaves = []
+
+    def walk(node, yngve, frazier):
+        if not node.children:
+            leaves.append((yngve, frazier))
+            return 1 if node.node_type == 'S' else 0
+        clauses = 1 if node.node_type == 'S' else 0
+        last = len(node.children) - 1
+        for i, child in enumerate(node.children):
+            if i == 0:
+                child_frazier = frazier + (1.5 if node.node_type == 'S' else 1)
+            else:
+                child_frazier = 0
+            clauses += walk(child, yngve + last - i, child_frazier)
+        return clauses
+
+    clauses = walk(tree, 0, 0)
+    yngve = [y for y, _ in leaves]
+    frazier = [f for _, f in leaves]
+    return {'num_clauses': clauses,
+            'total_Ydepth': sum(yngve), 'total_Fdepth': sum(frazier),
+            'mean_Ydepth': sum(yngve) / len(leaves), 'mean_Fdepth': sum(frazier) / len(leaves),
+            'max_Ydepth': max(yngve), 'max_Fdepth': max(frazier)}
+
+
+def scores(tree):
+    return {field: getattr(tree, field) for field in FIELDS}
+
+
+@pytest.mark.parametrize('build', [right_branching, left_branching])
+def test_deep_trees_do_not_recurse(build):
+    tree = build(5000)
+    assert len(tree.preorder()) > 5000 > sys.getrecursionlimit()
+    values = scores(tree)
+    assert len(tree.leaves) == 5001
+    assert tree.words.split() == ['w'] * 5001
+    repr(tree)
+    compact = tree.compact()
+    assert scores(compact) == pytest.approx(values)
+
+
+def test_right_branching_scores():
+    #Each leaf on the left has the spine as its one sibling to the right,
+    #and its Frazier chain stops at the spine node above it
+    tree = right_branching(5000)
+    assert tree.max_Ydepth == 1
+    assert tree.total_Ydepth == 5000
+    assert tree.max_Fdepth == 1.5
+    assert tree.num_clauses == 2500
+
+
+def test_left_branching_scores():
+    #The deepest leaf ends a path of 5000 leftmost children, each with one
+    #sibling to its right
+    tree = left_branching(5000)
+    assert tree.max_Ydepth == 5000
+    assert tree.max_Fdepth == 2500 * 1.5 + 2500 * 1
+    assert tree.num_clauses == 2500
+
+
+def test_wide_tree():
+    tree = wide(5000)
+    assert tree.total_words == 5000
+    assert tree.max_Ydepth == 4999
+    assert tree.total_Ydepth == sum(range(5000))
+    assert tree.max_Fdepth == 1.5
+    assert scores(tree.compact()) == pytest.approx(scores(tree))
+
+
+@pytest.mark.parametrize('build', [right_branching, left_branching, wide])
+def test_matches_reference_on_shallow_trees(build):
+    tree = build(200)
+    assert scores(tree) == pytest.approx(reference(tree))
+    assert scores(build(200).compact()) == pytest.approx(reference(tree))
+
+
+def test_matches_reference_on_random_trees():
+    rng = random.Random(4)
+    for _ in range(200):
+        tree = random_tree(rng)
+        expected = reference(tree)
+        assert scores(tree) == pytest.approx(expected)
+        assert scores(tree.compact()) == pytest.approx(expected)
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#depth is imported for tree metrics alone, so it must not pull in pandas or
+#the models
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_depth_import_is_light():
+    script = ('import sys, depth, sinks\n'
+              'print(sorted(m for m in ("pandas", "spacy", "torch", "allennlp") '
+              'if m in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Parses are cached under the quantization of the loaded model, not under
+#whatever the setting has been changed to since it was loaded
+import inference
+import models
+
+
+class Loaded:
+    pass
+
+
+def test_cache_archive_follows_loaded_model(monkeypatch):
+    monkeypatch.setitem(inference._settings, 'quantize', False)
+    monkeypatch.setitem(models._models, 'constituency', Loaded())
+    full = Loaded()
+    full._quantized = False
+    quantized = Loaded()
+    quantized._quantized = True
+
+    models.set('constituency', full)
+    inference.configure(quantize=True)
+    assert inference.cache_archive('archive', 'constituency') == 'archive'
+
+    models.set('constituency', quantized)
+    inference.configure(quantize=False)
+    assert inference.cache_archive('archive', 'constituency') == 'archive#int8'
+
+
+def test_cache_archive_before_loading(monkeypatch):
+    monkeypatch.setitem(inference._settings, 'quantize', True)
+    monkeypatch.delitem(models._models, 'dependency', raising=False)
+    assert inference.cache_archive('archive', 'dependency') == 'archive#int8'
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Stage records from the worker processes of corpus.py reach the Collector
+#of the parent
+import pytest
+
+import depth
+import instrumentation
+import models
+import splitting
+
+pytestmark = pytest.mark.usefixtures('stubs')
+
+TEXT = 'I like trees. Dogs bark loudly here. Yes. The cat sat on the mat. It rained.'
+
+
+def test_worker_stages_are_merged(monkeypatch):
+    #Workers preload every registered model, so the full spaCy splitter is
+    #swapped for the sentencizer the stubs fixture splits with
+    monkeypatch.setitem(models._loaders, 'sentence_splitter', splitting._load_sentencizer)
+    with instrumentation.Collector() as serial:
+        rows = depth.get_paragraph_statistics(TEXT)
+    with instrumentation.Collector() as parallel:
+        parallel_rows = depth.get_paragraph_statistics(TEXT, workers=2, chunk_size=2)
+    assert parallel_rows == rows
+    summary = parallel.summary()
+    assert summary['sentence_count'] == serial.summary()['sentence_count'] == 5
+    assert summary['stages']['constituency_predict']['calls'] == 3
+    assert summary['counters']['sentences_parsed'] == 5
+    assert {s['text'] for s in summary['slowest_sentences']} == \
+        {s['text'] for s in serial.summary()['slowest_sentences']}
+
+
+def test_workers_send_nothing_without_a_collector(monkeypatch):
+    monkeypatch.setitem(models._loaders, 'sentence_splitter', splitting._load_sentencizer)
+    assert len(depth.get_paragraph_statistics(TEXT, workers=2, chunk_size=2)) == 5
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Part of speech counts of pos_tally against the type_dict loop ConstituencyTree
+#used before, on plain and compact trees, alone and in batches, and with
+#custom tables
+import random
+
+import pos_tally
+from depth import ConstituencyTree
+
+TAGS = ['NN', 'NNS', 'NNP', 'NNPS', 'JJ', 'JJR', 'RB', 'RBR', 'VB', 'VBZ', 'VBD',
+        'DT', 'PRP', 'PRP$', 'CC', 'IN', 'MD', 'WDT', 'WP', '.', ',', 'CD']
+
+#The original tally: every prefix a tag starts with adds one to its count
+TYPE_DICT = {'V': 'verb_count', 'JJ': 'adj_count', 'N': 'noun_count',
+             'RB': 'adverb_count', 'DT': 'det_count',
+             'PRP': 'personal_pronoun_count', 'CC': 'conj_count',
+             'IN': 'prep_count', 'NNP': 'properN_count'}
+
+
+def reference(tags):
+    counts = dict.fromkeys(TYPE_DICT.values(), 0)
+    for tag in tags:
+        for prefix, name in TYPE_DICT.items():
+            if tag.startswith(prefix):
+                counts[name] += 1
+    return counts
+
+
+def sentence(tags):
+    return ConstituencyTree('S', [ConstituencyTree('NP', [ConstituencyTree(tag, word='w')])
+                                  for tag in tags])
+
+
+def random_tags(rng):
+    return [rng.choice(TAGS) for _ in range(rng.randint(1, 15))]
+
+
+def test_proper_nouns_are_nouns_too():
+    counts = sentence(['NNP', 'NNPS', 'NN']).tally_parts_of_speech()
+    assert counts['noun_count'] == 3
+    assert counts['properN_count'] == 2
+
+
+def test_matches_type_dict():
+    rng = random.Random(7)
+    tag_lists = [random_tags(rng) for _ in range(50)]
+    expected = [reference(tags) for tags in tag_lists]
+    plain = [sentence(tags) for tags in tag_lists]
+    compact = [tree.compact() for tree in plain]
+    assert ConstituencyTree.tally_parts_of_speech_batch(plain) == expected
+    assert ConstituencyTree.tally_parts_of_speech_batch(compact) == expected
+    for tags, tree, counts in zip(tag_lists, [sentence(tags) for tags in tag_lists], expected):
+        compact_tree = tree.compact()
+        assert tree.tally_parts_of_speech() == counts
+        assert compact_tree.parts_of_speech() == counts
+        for name, count in counts.items():
+            assert getattr(tree, name) == count
+            assert getattr(compact_tree, name) == count
+
+
+def test_custom_tables():
+    table = pos_tally.PosTable({
+            'wh_count': 'W',
+            'modal_count': 'MD',
+            'nominal_count': ['NN', 'PRP'],
+            'plural_count': lambda tag: tag.endswith('S'),
+    })
+    tags = ['WDT', 'WP', 'MD', 'NNS', 'PRP', 'NNPS', 'VBZ']
+    expected = {'wh_count': 2, 'modal_count': 1, 'nominal_count': 3,
+                'plural_count': 2}
+    tree = sentence(tags)
+    assert tree.tally_parts_of_speech(table) == expected
+    assert tree.compact().parts_of_speech(table) == expected
+    assert pos_tally.count_trees([tree, sentence(['NN', 'MD'])], table).tolist() == [
+            [2, 1, 3, 2], [0, 1, 1, 0]]
+    #A custom tally leaves the default counts alone
+    assert tree.noun_count == 2
+
+
+def test_compact_counts_are_tallied_once(monkeypatch):
+    calls = []
+    count_trees = pos_tally.count_trees
+
+    def counting(trees, table=None):
+        calls.append(len(trees))
+        return count_trees(trees, table)
+
+    monkeypatch.setattr(pos_tally, 'count_trees', counting)
+    tree = sentence(['NNP', 'VBZ', 'JJ', 'RB', 'DT']).compact()
+    [getattr(tree, name) for name in TYPE_DICT.values()]
+    assert calls == [1]
+
+    batch = [sentence(['NN', 'VB']).compact() for _ in range(3)]
+    ConstituencyTree.tally_parts_of_speech_batch(batch)
+    [getattr(tree, name) for tree in batch for name in TYPE_DICT.values()]
+    assert calls == [1, 3]
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Length-bucketed batching, with the stub predictors standing in for the
+#AllenNLP models
+import random
+
+import pytest
+
+import depth
+import instrumentation
+from scheduling import plan_batches
+
+
+pytestmark = pytest.mark.usefixtures('stubs')
+
+
+def test_plan_batches_respects_budget_and_covers_every_sentence():
+    rng = random.Random(2)
+    lengths = [rng.randint(1, 80) for _ in range(500)]
+    batches = plan_batches(lengths, max_tokens=256, batch_size=16)
+    assert sorted(i for batch in batches for i in batch) == list(range(500))
+    for batch in batches:
+        longest = max(lengths[i] for i in batch)
+        assert len(batch) <= 16
+        assert len(batch) == 1 or len(batch) * longest <= 256
+
+
+def padded_tokens(run):
+    padded = []
+    hook = lambda name, seconds, info: padded.append(info.get('padded_tokens', 0))
+    instrumentation.add_hook(hook)
+    try:
+        rows = run()
+    finally:
+        instrumentation.remove_hook(hook)
+    return rows, sum(padded)
+
+
+def test_paragraph_batches_are_planned_over_the_whole_paragraph():
+    #Short and long sentences mixed in every 16 sentences: planning within
+    #each 16 pads the short ones to the long ones
+    rng = random.Random(1)
+    text = ' '.join(' '.join(['word'] * rng.choice([3, 4, 40, 60])) + '.'
+                    for _ in range(200))
+    rows, whole = padded_tokens(lambda: depth.get_paragraph_statistics(text))
+    streamed, windowed = padded_tokens(lambda: list(depth.iter_paragraph_statistics(text)))
+    small, chunked = padded_tokens(
+            lambda: list(depth.iter_paragraph_statistics(text, window=16)))
+    assert rows == streamed == small
+    assert [row['sentenceID'] for row in rows] == list(range(200))
+    assert whole == windowed < 0.6 * chunked
+
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#The micro-batching service with the stub predictors, in particular that an
+#overloaded queue refuses whole requests and leaves the batching thread alive
+import threading
+
+import pytest
+
+from service import (MicroBatcher, QueueFull, RequestTooLarge, create_app,
+                     statistics_batch)
+
+
+pytestmark = pytest.mark.usefixtures('stubs')
+
+
+class Gate:
+    #A process_batch that holds every batch until the gate is opened
+    def __init__(self):
+        self.opened = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self, sentences):
+        self.started.set()
+        self.opened.wait(10)
+        return statistics_batch(sentences)
+
+
+def test_full_queue_refuses_the_whole_request():
+    gate = Gate()
+    batcher = MicroBatcher(gate, max_batch_size=1, max_latency=0, max_queue=3)
+    first = batcher.submit(['The first sentence.'])
+    gate.started.wait(10)
+    queued = batcher.submit(['One more.', 'And another.'])
+    with pytest.raises(QueueFull):
+        batcher.submit(['Too many.', 'For the room left.'])
+    assert batcher.stats['queued'] == 2
+    gate.opened.set()
+    results = [future.result(10) for future in first + queued]
+    assert [result['sentence_text'] for result in results] == \
+        ['The first sentence.', 'One more.', 'And another.']
+    assert batcher.stats['rejected'] == 1
+
+
+def test_cancelled_futures_do_not_stop_the_batching_thread():
+    gate = Gate()
+    batcher = MicroBatcher(gate, max_batch_size=4, max_latency=0, max_queue=8)
+    blocked = batcher.submit(['Held at the gate.'])
+    gate.started.wait(10)
+    abandoned = batcher.submit(['Nobody waits for this.', 'Or this.'])
+    for future in blocked + abandoned:
+        future.cancel()
+    gate.opened.set()
+    later, = batcher.submit(['Still parsed afterwards.'])
+    assert later.result(10)['sentence_text'] == 'Still parsed afterwards.'
+    assert batcher._thread.is_alive()
+
+
+def test_service_recovers_after_overload():
+    pytest.importorskip('flask')
+    gate = Gate()
+    batcher = MicroBatcher(gate, max_batch_size=1, max_latency=0, max_queue=2)
+    client = create_app(batcher, timeout=10).test_client()
+    held = batcher.submit(['Held at the gate.'])
+    gate.started.wait(10)
+    queued = batcher.submit(['Waiting.'])
+    response = client.post('/statistics', json={'sentences': ['One.', 'Two.']})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    gate.opened.set()
+    assert [future.result(10)['sentence_text'] for future in held + queued] == \
+        ['Held at the gate.', 'Waiting.']
+    response = client.post('/statistics', json={'sentence': 'I like trees.'})
+    assert response.status_code == 200
+    assert response.get_json()['sentence_text'] == 'I like trees.'
+    response = client.post('/statistics', json={'sentences': ['One.', 'Two.']})
+    assert [row['sentence_text'] for row in response.get_json()] == ['One.', 'Two.']
+
+
+def test_request_larger_than_the_queue_is_refused_for_good():
+    batcher = MicroBatcher(statistics_batch, max_queue=2)
+    with pytest.raises(RequestTooLarge):
+        batcher.submit(['One.', 'Two.', 'Three.'])
+    pytest.importorskip('flask')
+    client = create_app(batcher, timeout=10).test_client()
+    response = client.post('/statistics', json={'sentences': ['One.', 'Two.', 'Three.']})
+    assert response.status_code == 413
+    assert 'Retry-After' not in response.headers
+    assert 'at most 2' in response.get_json()['error']
+    assert batcher.stats['rejected'] == 2
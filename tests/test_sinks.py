@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import pytest
+
+import stats_table
+from sinks import ParquetSink
+
+
+def test_parquet_schema_is_fixed_across_chunks(tmp_path):
+    #The first chunk has only whole total_Fdepth values and a missing
+    #mean_SynDepLen, later chunks have fractions and numbers
+    pq = pytest.importorskip('pyarrow.parquet')
+    rows = [dict({field: None for field in stats_table.FIELDS},
+                 sentenceID=i, sentence_text='s', total_Fdepth=value,
+                 total_Ydepth=None if i == 3 else i,
+                 mean_SynDepLen=None if i < 2 else 1.5)
+            for i, value in enumerate([3, 3, 3.5, 4, 4.5])]
+    path = str(tmp_path / 'statistics.parquet')
+    with ParquetSink(path, chunk_size=2) as sink:
+        sink.write_all(rows)
+    table = pq.read_table(path)
+    assert str(table.schema.field('total_Fdepth').type) == 'double'
+    assert str(table.schema.field('total_Ydepth').type) == 'int64'
+    assert table.column('total_Fdepth').to_pylist() == [3, 3, 3.5, 4, 4.5]
+    assert table.column('total_Ydepth').to_pylist() == [0, 1, 2, None, 4]
+    assert table.column('mean_SynDepLen').to_pylist() == [None, None, 1.5, 1.5, 1.5]
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#Manual treebanks and CoNLL-U corpora, in particular sentences whose only
+#dependency is the root relation
+import io
+
+import pytest
+
+from depth import Paragraph
+from treebank import iter_treebank_statistics, parse_dependencies
+
+TREEBANK = '''(ROOT (FRAG (UH Hello) (. .)))
+
+root(ROOT-0, Hello-1)
+
+(ROOT (S (NP (NNS Dogs)) (VP (VBP bark)) (. .)))
+
+nsubj(bark-2, Dogs-1)
+root(ROOT-0, bark-2)
+punct(bark-2, .-3)
+'''
+
+CONLLU = '''# text = Hello
+1	Hello	hello	INTJ	UH	_	0	root	_	_
+
+# text = Dogs bark .
+1	Dogs	dog	NOUN	NNS	_	2	nsubj	_	_
+2	bark	bark	VERB	VBP	_	0	root	_	_
+3	.	.	PUNCT	.	_	2	punct	_	_
+
+'''
+
+
+def test_root_only_dependencies_have_no_tree():
+    assert parse_dependencies('root(ROOT-0, Hello-1)') is None
+
+
+def test_paragraph_of_a_one_word_sentence():
+    paragraph = Paragraph(constituency_trees=['(ROOT (FRAG (UH Hello)))'],
+                          dependency_trees=['root(ROOT-0, Hello-1)'], dirname='x')
+    row, = paragraph.statistics_per_sentence
+    assert row['mean_SynDepLen'] is None and row['max_SynDepLen'] is None
+    assert row['total_Ydepth'] == 0
+
+
+def test_treebank_statistics_with_a_root_only_sentence():
+    rows = list(iter_treebank_statistics(io.StringIO(TREEBANK)))
+    assert [row['total_SynDepLen'] for row in rows] == [None, 2]
+
+
+def test_conllu_root_only_sentence():
+    pytest.importorskip('conllu')
+    from conllu_corpus import iter_conllu_statistics, iter_conllu_trees
+    trees = list(iter_conllu_trees([io.StringIO(CONLLU)]))
+    assert trees[0] == ('Hello', None)
+    assert trees[1][1].total_SynDepLen == 2
+    rows = list(iter_conllu_statistics([io.StringIO(CONLLU)]))
+    assert [row['mean_SynDepLen'] for row in rows] == [None, 1.0]
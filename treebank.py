@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reader for manually annotated treebanks: PTB-style bracketed constituency
+trees, each optionally followed by its Stanford typed dependencies, one per
+line, e.g.
+
+    (ROOT
+      (S (NP (PRP I))
+        (VP (VBP like) (NP (NNS trees)))))
+    nsubj(like-2, I-1)
+    root(ROOT-0, like-2)
+    dobj(like-2, trees-3)
+
+The reader goes through the input a line at a time, with an explicit stack
+instead of recursion, and builds ConstituencyTree and DependencyTree objects
+directly. It never holds more than the tree being read in memory, so
+arbitrarily large treebanks can be streamed, optionally from a memory map.
+That makes it possible to compute Frazier, Yngve and SynDepLen statistics for
+whole treebanks without any neural parsing.
+"""
+import mmap as mmap_module
+import re
+
+from depth import ConstituencyTree, DependencyTree, tree_statistics
+
+_TOKEN = re.compile(r'\(|\)|[^\s()]+')
+_DEPENDENCY = re.compile(r"^\s*([\w:]+)\((.+)-(\d+)'*,\s*(.+)-(\d+)'*\)\s*$")
+
+#Wrappers that carry no syntactic information and are removed from the top of
+#a tree, so a tree reads the same as the allennlp parses, which have none
+_WRAPPERS = {'ROOT', 'TOP', ''}
+
+
+class TreebankError(ValueError):
+    pass
+
+
+class _TreeBuilder:
+    #Consumes bracket tokens and assembles one tree at a time without recursion
+    def __init__(self):
+        self.stack = []
+        self.expect_label = False
+
+    @property
+    def depth(self):
+        return len(self.stack)
+
+    def feed(self, token, line_number):
+        #Returns a finished tree once its last bracket has been fed
+        if self.expect_label:
+            self.expect_label = False
+            if token not in '()':
+                self.stack[-1][0] = token
+                return None
+            #An unlabeled bracket, as in ( (S ...) ), opens a wrapper
+        if token == '(':
+            self.stack.append(['', [], None])
+            self.expect_label = True
+        elif token == ')':
+            if not self.stack:
+                raise TreebankError(f'unbalanced ")" on line {line_number}')
+            node_type, children, word = self.stack.pop()
+            if word is not None:
+                node = ConstituencyTree(node_type, None, word)
+            else:
+                node = ConstituencyTree(node_type, children)
+            if not self.stack:
+                return _unwrap(node)
+            self.stack[-1][1].append(node)
+        else:
+            if not self.stack:
+                raise TreebankError(f'word {token!r} outside brackets on line {line_number}')
+            if self.stack[-1][2] is not None or self.stack[-1][1]:
+                raise TreebankError(f'unexpected word {token!r} on line {line_number}')
+            self.stack[-1][2] = token
+        return None
+
+
+def _unwrap(tree):
+    while tree.node_type in _WRAPPERS and tree.children and len(tree.children) == 1:
+        tree = tree.children[0]
+        tree.parent = None
+    return tree
+
+
+def _lines(source, mmap=False):
+    #Yields the lines of a path or an open file without reading it whole
+    if not isinstance(source, str):
+        yield from source
+        return
+    with open(source, 'rb') as f:
+        if mmap:
+            with mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ) as mapped:
+                for line in iter(mapped.readline, b''):
+                    yield line.decode('utf-8')
+        else:
+            for line in f:
+                yield line.decode('utf-8')
+
+
+def dependency_relation(line):
+    #Parses one typed dependency line into (relation, head, head_index,
+    #tail, tail_index) with 1-based indices, or returns None
+    match = _DEPENDENCY.match(line)
+    if not match:
+        return None
+    relation, head, head_index, tail, tail_index = match.groups()
+    return relation, head, int(head_index), tail, int(tail_index)
+
+
+def build_dependency_tree(relations):
+    #Makes a DependencyTree from typed dependency relations, leaving out the
+    #root relation as the allennlp conversion does. Like that conversion it
+    #returns None when no relation is left, as for a one-word sentence.
+    dependency_tree = DependencyTree()
+    for relation, head, head_index, tail, tail_index in relations:
+        if head_index == 0:
+            continue
+        dependency_tree.add(head, head_index - 1, relation, tail, tail_index - 1)
+    if not dependency_tree.relation_types:
+        return None
+    return dependency_tree
+
+
+def iter_treebank(source, mmap=False):
+    #Yields (ConstituencyTree, DependencyTree) pairs from a path or an open
+    #file (io.StringIO for text already in memory). The DependencyTree is None
+    #when a tree has no dependency lines after it. Lines outside trees that
+    #are not dependencies are skipped.
+    builder = _TreeBuilder()
+    tree = None
+    relations = []
+    for line_number, line in enumerate(_lines(source, mmap), 1):
+        if not builder.depth and not line.lstrip().startswith('('):
+            relation = dependency_relation(line)
+            if relation and tree is not None:
+                relations.append(relation)
+            continue
+        if not builder.depth and tree is not None:
+            yield tree, build_dependency_tree(relations) if relations else None
+            tree, relations = None, []
+        for token in _TOKEN.findall(line):
+            if tree is not None:
+                #A second tree starting on the line the first one ended
+                yield tree, None
+                tree = None
+            tree = builder.feed(token, line_number)
+    if builder.depth:
+        raise TreebankError(f'{builder.depth} unclosed brackets at end of input')
+    if tree is not None:
+        yield tree, build_dependency_tree(relations) if relations else None
+
+
+def parse_bracketed(text):
+    #Reads a single bracketed tree. Text left over after the ROOT bracket of
+    #a manual annotation has been cut off, like " (S ...)", also works.
+    builder = _TreeBuilder()
+    tree = None
+    for token in _TOKEN.findall(text):
+        if tree is not None:
+            raise TreebankError('more than one tree in text')
+        tree = builder.feed(token, 1)
+    if builder.depth or tree is None:
+        raise TreebankError('unbalanced brackets in tree')
+    return tree
+
+
+def parse_dependencies(text):
+    #Reads a block of typed dependency lines into a DependencyTree, or None
+    #if there is no relation but the root
+    return build_dependency_tree(
+            relation for relation in map(dependency_relation, text.splitlines())
+            if relation)
+
+
+def iter_treebank_statistics(source, mmap=False):
+    #Yields the statistics row of every tree in a treebank, numbered by
+    #sentenceID, without any neural parsing. SynDepLen statistics are None
+    #for trees without dependencies.
+    for i, (ct, dt) in enumerate(iter_treebank(source, mmap)):
+        yield {**tree_statistics(ct.words, ct, dt), **{'sentenceID': i}}